@@ -0,0 +1,136 @@
+"""
+Precomputed school-admin reports, kept next to the data they summarize:
+
+    Aggregates/Submissions/<academicYear>/<teacherId>/week_<n>/<courseId>
+        -> number of days submitted (server-side increment)
+    Aggregates/Marks/<courseId>
+        -> {students, average: {mark20, ...}, totalAverage, updatedAt}
+
+Submission counters are bumped only by the request whose transaction
+created a new LessonPlanSubmissions record, so a day is counted once.  A course's mark summary is recomputed from
+its own ClassMarks/<courseId> subtree (one class, not the school) after every
+gradebook save, so any drift heals on the next save.  The reporting
+endpoints only read Aggregates/*; `flask rebuild-aggregates` recomputes
+everything from scratch.
+"""
+import os
+from datetime import datetime
+
+import datastore
+import indexes
+
+AGGREGATES_ROOT = "Aggregates"
+SUBMISSIONS = "Submissions"
+MARKS = "Marks"
+
+SCHOOL_DAYS_PER_WEEK = int(os.environ.get("SCHOOL_DAYS_PER_WEEK", "5"))
+MARK_FIELDS = ("mark20", "mark30", "mark50", "mark100")
+
+
+def _path(*parts):
+    return "/".join([AGGREGATES_ROOT] + [indexes.encode_key(p) for p in parts])
+
+
+def submissions_path(academic_year, teacher_id=None, week=None):
+    parts = [SUBMISSIONS, academic_year]
+    if teacher_id:
+        parts.append(teacher_id)
+        if week not in (None, ""):
+            parts.append(f"week_{week}")
+    return _path(*parts)
+
+
+# ---------------- lesson plan submissions ----------------
+def submission_entries(submission):
+    """Counter increment for one new LessonPlanSubmissions record (needs a week)."""
+    s = submission or {}
+    if not all(s.get(f) not in (None, "") for f in ("academicYear", "teacherId", "week", "courseId")):
+        return {}
+    path = submissions_path(s["academicYear"], s["teacherId"], s["week"])
+    return {f"{path}/{indexes.encode_key(s['courseId'])}": datastore.increment(1)}
+
+
+def submission_report(counts, courses_of_teacher):
+    """
+    Turn {teacherId: {week_n: {courseId: days}}} into per teacher/week
+    compliance: submitted, expected (assigned courses x school days), percent.
+    """
+    report = {}
+    for teacher_id, weeks in (counts or {}).items():
+        if not isinstance(weeks, dict):
+            continue
+        teacher_id = indexes.decode_key(teacher_id)
+        expected = len(courses_of_teacher(teacher_id)) * SCHOOL_DAYS_PER_WEEK
+        report[teacher_id] = {}
+        for week, per_course in weeks.items():
+            if not isinstance(per_course, dict):
+                continue
+            submitted = sum(v for v in per_course.values() if isinstance(v, (int, float)))
+            report[teacher_id][indexes.decode_key(week)] = {
+                "submitted": submitted,
+                "expected": expected,
+                "percent": round(100.0 * submitted / expected, 1) if expected else None,
+                "courses": {indexes.decode_key(c): v for c, v in per_course.items()},
+            }
+    return report
+
+
+# ---------------- marks ----------------
+def summarize_marks(course_marks):
+    """{students, average: {field: avg}, totalAverage} for one ClassMarks/<courseId> subtree."""
+    rows = [m for m in (course_marks or {}).values() if isinstance(m, dict)]
+    fields = [f for f in MARK_FIELDS if any(f in m for m in rows)]
+    totals = {f: sum(m.get(f, 0) or 0 for m in rows) for f in fields}
+    count = len(rows)
+    return {
+        "students": count,
+        "average": {f: round(totals[f] / count, 2) for f in fields} if count else {},
+        "totalAverage": round(sum(sum(m.get(f, 0) or 0 for f in fields) for m in rows) / count, 2) if count else None,
+        "updatedAt": datetime.utcnow().isoformat(),
+    }
+
+
+def refresh_course_marks(course_id):
+    """Recompute Aggregates/Marks/<courseId> from the course's marks (one read, one write)."""
+    summary = summarize_marks(datastore.reference("ClassMarks").child(course_id).get())
+    datastore.reference(_path(MARKS, course_id)).set(summary)
+    return summary
+
+
+def marks_report(course_id=None):
+    if course_id:
+        summary = datastore.reference(_path(MARKS, course_id)).get()
+        return {course_id: summary} if summary else {}
+    return {indexes.decode_key(c): v for c, v in (datastore.reference(_path(MARKS)).get() or {}).items()}
+
+
+# ---------------- rebuild ----------------
+def rebuild():
+    """Recompute every aggregate from LessonPlanSubmissions and ClassMarks. Returns counts."""
+    counts = {}
+
+    def walk(node):
+        if not isinstance(node, dict):
+            return
+        if node.get("submittedAt") and node.get("teacherId"):
+            for path in submission_entries(node):
+                counts[path] = counts.get(path, 0) + 1
+            return
+        for child in node.values():
+            walk(child)
+
+    walk(datastore.reference("LessonPlanSubmissions").get())
+    marks = {
+        indexes.encode_key(course_id): summarize_marks(course_marks)
+        for course_id, course_marks in (datastore.reference("ClassMarks").get() or {}).items()
+    }
+
+    submissions = {}
+    for path, count in counts.items():
+        branch = submissions
+        parts = path.split("/")[2:]  # drop Aggregates/Submissions
+        for part in parts[:-1]:
+            branch = branch.setdefault(part, {})
+        branch[parts[-1]] = count
+    datastore.reference(AGGREGATES_ROOT).update({SUBMISSIONS: submissions or None, MARKS: marks or None})
+    return {"submission counters": len(counts), "courses": len(marks)}
@@ -0,0 +1,375 @@
+"""
+ASGI entry point: async serving for the I/O-bound read endpoints.
+
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT --workers 2
+
+Under gunicorn (app:app --workers=2 --threads=4) a request holds one of 8
+threads through all of its RTDB round trips.  Here every request still runs
+through the unchanged Flask app (so CORS, ETags, compression and
+instrumentation apply), on a thread pool, but for the routes in PREFETCH the
+gateway first issues the handler's backend reads on the event loop
+(async_rtdb), all at once.  The handler then finds them in memory
+(datastore.use_prefetched) and only holds a thread for its CPU work, so one
+process can keep hundreds of backend reads open.
+
+ASGI_THREADS sizes the thread pool (default 32).  A failed read-ahead is
+logged and the handler simply reads for itself.
+
+Request bodies are read into memory before the handler runs, up to
+ASGI_MAX_BODY bytes (default 16 MiB); a larger one is answered with 413.
+The routes in STREAMED_BODY (the roster import) instead get a wsgi.input
+that pulls the body from the connection as the handler reads it, so an
+upload of any size is parsed batch by batch.
+
+The post feed (post_feed.FEED_PATH, Server-Sent Events) does not go through
+Flask at all: each open stream is an async generator on the loop fed by the
+process's shared listeners, so a dashboard left open holds no thread.
+Attaching and closing those listeners blocks, so it runs on the pool.
+"""
+import asyncio
+import io
+import logging
+import os
+import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import async_rtdb
+import datastore
+import indexes
+import post_feed
+from app import app as flask_app, assigned_courses, cache, feed, writes
+
+log = logging.getLogger(__name__)
+
+ASGI_THREADS = int(os.environ.get("ASGI_THREADS", "32"))
+ASGI_MAX_BODY = int(os.environ.get("ASGI_MAX_BODY", str(16 * 1024 * 1024)))
+
+# handlers that read their body as a stream (roster_import parses it row by row)
+STREAMED_BODY = re.compile(r"/api/import/[^/]+")
+
+
+# ===================== READ-AHEAD PLANS =====================
+# Each plan issues the plain get()s its Flask handler is about to make.
+async def course_students(gateway, prefetcher, query, course_id):
+    # rosters come from the read cache: only the marks are a backend read
+    course = await gateway.run_sync(cache.get_child, "Courses", course_id)
+    if course:
+        await prefetcher.get_all([f"ClassMarks/{course_id}"])
+
+
+async def teacher_students(gateway, prefetcher, query, user_id):
+    teacher_key, = await prefetcher.get_all([indexes.teacher_key_path(user_id)])
+    if not teacher_key:
+        return
+    courses = await gateway.run_sync(assigned_courses, teacher_key)
+    await prefetcher.get_all([f"ClassMarks/{course_id}" for course_id, _ in courses])
+
+
+async def all_posts(gateway, prefetcher, query):
+    # paged requests (limit/before) make a single query: nothing to overlap
+    if not query.get("limit") and not query.get("before"):
+        await prefetcher.get_all(["Posts"])
+
+
+PREFETCH = (
+    (r"/api/course/(?P<course_id>[^/]+)/students", course_students),
+    (r"/api/teacher/(?P<user_id>[^/]+)/students", teacher_students),
+    (r"/api/get_posts", all_posts),
+)
+
+
+# ===================== GATEWAY =====================
+class Gateway:
+    def __init__(self, wsgi_app, prefetch=PREFETCH, threads=ASGI_THREADS, max_body=ASGI_MAX_BODY):
+        self.wsgi_app = wsgi_app
+        self.max_body = max_body
+        self.routes = [(re.compile(pattern), plan) for pattern, plan in prefetch]
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="asgi")
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = async_rtdb.from_env()
+        return self._client
+
+    async def run_sync(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        if scope["path"] == post_feed.FEED_PATH and scope["method"] == "GET":
+            await self._stream_feed(scope, receive, send)
+            return
+
+        if STREAMED_BODY.fullmatch(scope["path"]):
+            stream = io.BufferedReader(ReceiveStream(receive, asyncio.get_running_loop()))
+            # the handler's reads consume receive(): no disconnect watcher
+            await self._run_wsgi(wsgi_environ(scope, stream=stream), {}, receive, send, watch=False)
+            return
+
+        declared = _content_length(scope)
+        if declared is not None and declared > self.max_body:
+            await _too_large(send)
+            return
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if len(body) > self.max_body:
+                await _too_large(send)
+                return
+            if not message.get("more_body"):
+                break
+
+        environ = wsgi_environ(scope, bytes(body))
+        prefetched = await self._prefetch(scope, environ) if scope["method"] == "GET" else {}
+        await self._run_wsgi(environ, prefetched, receive, send)
+
+    async def _prefetch(self, scope, environ):
+        for pattern, plan in self.routes:
+            match = pattern.fullmatch(scope["path"])
+            if match:
+                break
+        else:
+            return {}
+
+        prefetcher = async_rtdb.Prefetcher(self.client)
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        try:
+            await plan(self, prefetcher, query, **match.groupdict())
+        except Exception as e:
+            log.warning("read-ahead for %s failed (%s), handler reads itself", scope["path"], e)
+        environ["gojo.prefetch_stats"] = prefetcher.stats()
+        return prefetcher.values
+
+    async def _run_wsgi(self, environ, prefetched, receive, send, watch=True):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        disconnected = threading.Event()
+
+        def put(*message):
+            loop.call_soon_threadsafe(queue.put_nowait, message)
+
+        def run():
+            status_headers = []
+            started = False
+
+            def start_response(status, headers, exc_info=None):
+                status_headers[:] = [status, headers]
+                return write
+
+            def write(data):
+                nonlocal started
+                if not started:
+                    put("start", *status_headers)
+                    started = True
+                if data:
+                    put("body", data)
+
+            try:
+                if prefetched:
+                    with datastore.use_prefetched(prefetched):
+                        self._iterate(environ, start_response, write, disconnected)
+                else:
+                    self._iterate(environ, start_response, write, disconnected)
+                write(b"")
+                put("end")
+            except Exception as e:
+                put("error", e, started)
+
+        loop.run_in_executor(self.executor, run)
+        watcher = asyncio.ensure_future(_watch_disconnect(receive, disconnected)) if watch else None
+        try:
+            while True:
+                kind, *payload = await queue.get()
+                if kind == "start":
+                    status, headers = payload
+                    await send({
+                        "type": "http.response.start",
+                        "status": int(status.split(" ", 1)[0]),
+                        "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers],
+                    })
+                elif kind == "body":
+                    await send({"type": "http.response.body", "body": payload[0], "more_body": True})
+                elif kind == "end":
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+                    return
+                else:
+                    error, started = payload
+                    log.error("WSGI app failed", exc_info=error)
+                    if not started:
+                        await send({"type": "http.response.start", "status": 500,
+                                    "headers": [(b"content-type", b"text/plain")]})
+                    await send({"type": "http.response.body", "body": b"" if started else b"Internal Server Error"})
+                    return
+        finally:
+            disconnected.set()  # stops a streaming body whose client has gone
+            if watcher is not None:
+                watcher.cancel()
+
+    async def _stream_feed(self, scope, receive, send):
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        teacher_id = (query.get("teacherId") or [None])[0]
+        last_event_id = headers.get("last-event-id") or (query.get("lastEventId") or [None])[0]
+
+        response_headers = [(b"content-type", b"text/event-stream; charset=utf-8")]
+        response_headers += [(k.lower().encode("latin-1"), v.encode("latin-1"))
+                             for k, v in post_feed.STREAM_HEADERS.items()]
+        if headers.get("origin"):
+            # what flask_cors adds for the app's origins="*", supports_credentials=True
+            response_headers += [
+                (b"access-control-allow-origin", headers["origin"].encode("latin-1")),
+                (b"access-control-allow-credentials", b"true"),
+                (b"vary", b"Origin"),
+            ]
+        await send({"type": "http.response.start", "status": 200, "headers": response_headers})
+
+        async def pump():
+            async for chunk in feed.astream(teacher_id, last_event_id, executor=self.executor):
+                await send({"type": "http.response.body", "body": chunk.encode("utf-8"), "more_body": True})
+
+        streaming = asyncio.ensure_future(pump())
+        disconnect = asyncio.ensure_future(_watch_disconnect(receive, threading.Event()))
+        await asyncio.wait({streaming, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+        disconnect.cancel()
+        if streaming.done():
+            if streaming.exception() is None:
+                # ended by the feed (reset): close the response so the client reconnects
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+            else:
+                log.warning("post feed stream failed: %s", streaming.exception())
+        else:
+            streaming.cancel()  # the generator's finally unsubscribes
+
+    def _iterate(self, environ, start_response, write, disconnected):
+        result = self.wsgi_app(environ, start_response)
+        try:
+            for chunk in result:
+                if disconnected.is_set():
+                    break
+                write(chunk)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._client is not None:
+                    await self._client.close()
+                self.executor.shutdown(wait=False)
+                # queued post seen flags, before the process goes away
+                await asyncio.get_running_loop().run_in_executor(None, writes.stop)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+async def _watch_disconnect(receive, disconnected):
+    while not disconnected.is_set():
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            disconnected.set()
+
+
+class ReceiveStream(io.RawIOBase):
+    """
+    wsgi.input that pulls the request body from ASGI receive() as the WSGI
+    app reads it, on the app's thread.  A client that disconnects before the
+    end of the body raises OSError, so a truncated upload is not taken for a
+    complete one.
+    """
+
+    def __init__(self, receive, loop):
+        self._receive = receive
+        self._loop = loop
+        self._pending = b""
+        self._done = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending and not self._done:
+            message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+            if message["type"] == "http.disconnect":
+                raise OSError("client disconnected before the end of the request body")
+            self._pending = message.get("body", b"")
+            self._done = not message.get("more_body")
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+
+def _content_length(scope):
+    for name, value in scope.get("headers", []):
+        if name.lower() == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+async def _too_large(send):
+    await send({"type": "http.response.start", "status": 413,
+                "headers": [(b"content-type", b"application/json"), (b"connection", b"close")]})
+    await send({"type": "http.response.body",
+                "body": b'{"message":"Request body too large","success":false}'})
+
+
+def wsgi_environ(scope, body=b"", stream=None):
+    """
+    PEP 3333 environ for an ASGI http scope, with the buffered `body` or a
+    `stream` read as the app goes.
+    """
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": stream if stream is not None else io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            environ[name] = value
+            continue
+        key = f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    if stream is not None:
+        # chunked uploads have no Content-Length: the stream's end is the body's end
+        environ["wsgi.input_terminated"] = True
+    else:
+        environ.setdefault("CONTENT_LENGTH", str(len(body)))
+    return environ
+
+
+app = Gateway(flask_app)
@@ -0,0 +1,120 @@
+"""
+Non-blocking RTDB reads for the async gateway (asgi.py).
+
+firebase_admin's db module blocks a thread per call.  RestClient talks to
+the RTDB REST API over one pooled httpx.AsyncClient instead, so a single
+event loop can keep hundreds of reads in flight.  It authenticates with the
+same service account as firebase_admin (an OAuth2 access token, refreshed
+off the loop when it expires).
+
+Only plain gets are needed: the gateway reads ahead, the Flask handlers
+still do every write.
+"""
+import asyncio
+import logging
+import os
+import time
+from urllib.parse import quote
+
+import datastore
+
+ASYNC_RTDB_CONNECTIONS = int(os.environ.get("ASYNC_RTDB_CONNECTIONS", "200"))
+ASYNC_RTDB_TIMEOUT = float(os.environ.get("ASYNC_RTDB_TIMEOUT", "10"))
+
+# httpx logs every request at INFO; one line per RTDB read is noise here
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+class RestClient:
+    def __init__(self, database_url=datastore.DATABASE_URL, credential=None,
+                 max_connections=ASYNC_RTDB_CONNECTIONS, timeout=ASYNC_RTDB_TIMEOUT):
+        import httpx
+
+        self.database_url = database_url.rstrip("/")
+        self._credential = credential
+        self._token_lock = asyncio.Lock()
+        self._http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=timeout,
+        )
+
+    async def _access_token(self):
+        async with self._token_lock:
+            if self._credential is None:
+                import firebase_admin
+                datastore.ensure_firebase()
+                self._credential = firebase_admin.get_app().credential.get_credential()
+            if not self._credential.valid:
+                from google.auth.transport.requests import Request
+                await asyncio.to_thread(self._credential.refresh, Request())
+            return self._credential.token
+
+    async def get(self, path):
+        return (await self.get_sized(path))[0]
+
+    async def get_sized(self, path):
+        """(value, bytes on the wire): the size comes free with the response."""
+        token = await self._access_token()
+        url = f"{self.database_url}/{quote(datastore.normalize_path(path))}.json"
+        response = await self._http.get(url, headers={"Authorization": f"Bearer {token}"})
+        response.raise_for_status()
+        return response.json(), len(response.content)
+
+    async def close(self):
+        await self._http.aclose()
+
+
+class LocalClient:
+    """The same interface on the local backend (honours LOCAL_DATASTORE_LATENCY_MS)."""
+
+    def __init__(self, store):
+        self.store = store
+
+    async def get(self, path):
+        return await self.store.get_async(path)
+
+    async def get_sized(self, path):
+        """(value, None): there is no wire size, instrumentation estimates it if enabled."""
+        return await self.get(path), None
+
+    async def close(self):
+        pass
+
+
+class Prefetcher:
+    """Issues a group of gets concurrently and keeps the numbers instrumentation reports."""
+
+    def __init__(self, client):
+        self.client = client
+        self.values = {}
+        self.reads = 0
+        self.seconds = 0.0
+        self.bytes_down = 0
+
+    async def _get(self, path):
+        from instrumentation import payload_size
+
+        start = time.perf_counter()
+        value, size = await self.client.get_sized(path)
+        self.seconds += time.perf_counter() - start
+        self.reads += 1
+        self.bytes_down += payload_size(value) if size is None else size
+        self.values[path] = value
+        return value
+
+    async def get_all(self, paths):
+        """Read every path at once; returns their values in order."""
+        results = await asyncio.gather(*(self._get(p) for p in paths), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+
+    def stats(self):
+        return {"seconds": self.seconds, "reads": self.reads, "bytes_down": self.bytes_down}
+
+
+def from_env():
+    if datastore.is_local():
+        return LocalClient(datastore.local_store())
+    return RestClient()
@@ -0,0 +1,209 @@
+"""
+Password hashing and signed session tokens for teacher login.
+
+Passwords are stored as salted scrypt hashes:
+
+    scrypt$<n>$<r>$<p>$<salt b64>$<hash b64>
+
+scrypt is deliberately slow (tens of ms of CPU and 16 MB per check at the
+defaults), so hashing and verification run on a process pool
+(PASSWORD_HASH_WORKERS, default 2; 0 runs them inline) instead of holding
+the GIL of a worker serving other requests.  The pool starts on the first
+hash, from a forkserver (spawn where there is none): by then the process
+runs listener threads, and forking it directly could deadlock them (as
+with any spawned process, a script run directly, like `python app.py`, is
+re-imported by the pool processes: use it for development only).  A pool
+whose process died is replaced and the task retried once; a task the pool
+does not finish within PASSWORD_HASH_TIMEOUT raises HasherUnavailable,
+which app.py answers with 503 and Retry-After.
+
+Users records still holding a plaintext password (older accounts, or one
+changed from the dashboard's settings page, which writes RTDB directly)
+are compared in constant time and re-hashed on the next successful login:
+verify() reports needs_rehash for them.
+
+Sessions are stateless: Sessions.issue() signs {userId, teacherKey, role}
+with itsdangerous (a Flask dependency) and Sessions.read() checks signature
+and age, so a request carrying `Authorization: Bearer <token>` is
+identified without any RTDB read.  SESSION_SECRET must be the same on every
+worker and instance; without it no tokens are issued or accepted (a
+per-process secret would make tokens fail on every other worker).
+"""
+import atexit
+import base64
+import hashlib
+import hmac
+import logging
+import multiprocessing
+import os
+import secrets
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+log = logging.getLogger(__name__)
+
+HASH_PREFIX = "scrypt"
+SCRYPT_N = int(os.environ.get("SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = 8
+SCRYPT_P = 1
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_TIMEOUT = float(os.environ.get("PASSWORD_HASH_TIMEOUT", "10"))
+HASHER_RETRY_AFTER = 5  # seconds, sent with the 503
+
+SESSION_TTL = int(os.environ.get("SESSION_TTL", str(12 * 3600)))  # seconds
+SESSION_SALT = "teacher-session"
+
+
+# ---------------- hashing (runs in pool processes) ----------------
+def _b64(raw):
+    return base64.b64encode(raw).decode("ascii")
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r, dklen=32)
+
+
+def hash_password(password, n=SCRYPT_N):
+    salt = secrets.token_bytes(16)
+    digest = _scrypt(password, salt, n, SCRYPT_R, SCRYPT_P)
+    return f"{HASH_PREFIX}${n}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(digest)}"
+
+
+def is_hashed(stored):
+    return isinstance(stored, str) and stored.startswith(HASH_PREFIX + "$")
+
+
+def verify_password(password, stored):
+    """(matches, needs_rehash) for a stored hash or a legacy plaintext value."""
+    if not isinstance(password, str) or stored in (None, ""):
+        return False, False
+    if not is_hashed(stored):
+        return hmac.compare_digest(password.encode("utf-8"), str(stored).encode("utf-8")), True
+    try:
+        _, n, r, p, salt, digest = stored.split("$")
+        n, r, p = int(n), int(r), int(p)
+        actual = _scrypt(password, base64.b64decode(salt), n, r, p)
+    except (ValueError, TypeError):
+        return False, False
+    matches = hmac.compare_digest(actual, base64.b64decode(digest))
+    return matches, matches and n != SCRYPT_N
+
+
+# ---------------- process pool ----------------
+class HasherUnavailable(Exception):
+    """The pool could not hash in time (overloaded or broken): retry later."""
+
+
+class PasswordHasher:
+    """hash / verify off the request thread, on a lazily started process pool."""
+
+    def __init__(self, workers=PASSWORD_HASH_WORKERS, timeout=PASSWORD_HASH_TIMEOUT):
+        self.workers = workers
+        self.timeout = timeout
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                atexit.register(self.shutdown)
+            return self._pool
+
+    def _discard(self, pool):
+        """Drop a broken pool (unless another thread already replaced it)."""
+        with self._lock:
+            if self._pool is not pool:
+                return
+            self._pool = None
+        log.warning("password hasher: pool is broken, starting a new one")
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, call):
+        """call(pool) on the pool; a broken pool is replaced and the call retried once."""
+        for attempt in range(2):
+            pool = self._get_pool()
+            try:
+                return call(pool)
+            except BrokenProcessPool:
+                self._discard(pool)
+                if attempt:
+                    raise HasherUnavailable("password hashing pool keeps failing")
+            except FutureTimeout:
+                raise HasherUnavailable(f"password hashing took over {self.timeout}s")
+
+    def _submit(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+
+        def call(pool):
+            future = pool.submit(fn, *args)
+            try:
+                return future.result(timeout=self.timeout)
+            except FutureTimeout:
+                future.cancel()  # still queued: nobody waits for it any more
+                raise
+        return self._run(call)
+
+    def hash(self, password):
+        return self._submit(hash_password, password)
+
+    def hash_many(self, passwords):
+        """Hash a batch (roster import) across all pool processes."""
+        if self.workers <= 0:
+            return [hash_password(p) for p in passwords]
+        passwords = list(passwords)
+        timeout = self.timeout * max(1, len(passwords) // self.workers)
+        return self._run(lambda pool: list(pool.map(hash_password, passwords, timeout=timeout)))
+
+    def verify(self, password, stored):
+        """(matches, needs_rehash); plaintext is compared here, only hashes go to the pool."""
+        if not is_hashed(stored):
+            return verify_password(password, stored)
+        return self._submit(verify_password, password, stored)
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+# ---------------- session tokens ----------------
+class Sessions:
+    def __init__(self, secret=None, ttl=SESSION_TTL):
+        secret = secret or os.environ.get("SESSION_SECRET")
+        if not secret:
+            log.warning("SESSION_SECRET is not set: session tokens are disabled")
+        self.ttl = ttl
+        self._serializer = URLSafeTimedSerializer(secret, salt=SESSION_SALT) if secret else None
+
+    @property
+    def enabled(self):
+        return self._serializer is not None
+
+    def issue(self, user_id, teacher_key, role="teacher"):
+        """A signed token, or None when no SESSION_SECRET is configured."""
+        if not self.enabled:
+            return None
+        return self._serializer.dumps({"userId": user_id, "teacherKey": teacher_key, "role": role})
+
+    def read(self, token):
+        """The session payload, or None for a missing, forged or expired token."""
+        if not token or not self.enabled:
+            return None
+        try:
+            return self._serializer.loads(token, max_age=self.ttl)
+        except (SignatureExpired, BadSignature):
+            return None
+
+    def from_request(self, request):
+        header = request.headers.get("Authorization", "")
+        scheme, _, token = header.partition(" ")
+        return self.read(token.strip()) if scheme.lower() == "bearer" else None
@@ -0,0 +1,128 @@
+"""
+Thread-bound WSGI serving vs the async gateway (asgi.py) under backend latency.
+
+    cd backend
+    python -m benchmarks.async_serving
+    python -m benchmarks.async_serving --users 10000 --latency-ms 50 --concurrency 8,64,256
+
+Both modes run in this process on the local datastore with every round trip
+delayed by --latency-ms, standing in for the HTTPS calls to RTDB:
+
+  wsgi   --wsgi-threads client threads calling the Flask app directly, like
+         gunicorn's workers x threads (8 in the Dockerfile)
+  asgi   asyncio clients calling asgi.app through httpx.ASGITransport, at
+         each --concurrency level
+
+Reported per scenario: throughput, p50/p95 latency and errors.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+
+from benchmarks.run import make_request, percentile
+
+SCENARIOS = ("get_course_students", "get_teacher_students", "get_posts", "teacher_login")
+
+
+def summarize(latencies, errors, wall):
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "throughput_rps": round(len(latencies) / wall, 1) if wall else 0.0,
+    }
+
+
+def run_wsgi(flask_app, meta, name, threads, requests_total, seed):
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    per_thread = max(1, requests_total // threads)
+
+    def worker(index):
+        client = flask_app.test_client()
+        rnd = random.Random(seed * 1000 + index)
+        for _ in range(per_thread):
+            start = time.perf_counter()
+            response = make_request(name, client, meta, rnd)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+                errors[0] += response.status_code >= 400
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    wall = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return summarize(latencies, errors[0], time.perf_counter() - wall)
+
+
+async def run_asgi(asgi_app, meta, name, concurrency, requests_total, seed):
+    import httpx
+
+    latencies, errors = [], [0]
+    per_task = max(1, requests_total // concurrency)
+    transport = httpx.ASGITransport(app=asgi_app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker(index):
+            rnd = random.Random(seed * 1000 + index)
+            for _ in range(per_task):
+                start = time.perf_counter()
+                response = await make_request(name, client, meta, rnd)
+                latencies.append(time.perf_counter() - start)
+                errors[0] += response.status_code >= 400
+
+        wall = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        wall = time.perf_counter() - wall
+    return summarize(latencies, errors[0], wall)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--latency-ms", type=float, default=30.0, help="simulated RTDB round trip")
+    parser.add_argument("--wsgi-threads", type=int, default=8)
+    parser.add_argument("--concurrency", default="8,64,256", help="async client counts")
+    parser.add_argument("--requests", type=int, default=512, help="requests per scenario and mode")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    os.environ["DATASTORE"] = "local"
+    os.environ.setdefault("REQUEST_LOG", "0")
+    os.environ.setdefault("READ_POOL_SIZE", "64")
+    import datastore
+    from benchmarks.synthetic import generate_school
+
+    tree, meta = generate_school(users=args.users, seed=args.seed)
+    datastore.use_local(datastore.LocalStore(tree))
+    del tree
+
+    import asgi
+    flask_app = asgi.flask_app
+    # the cache fills at import time; only requests pay the round-trip latency
+    datastore.local_store().latency = args.latency_ms / 1000.0
+
+    header = f"{'scenario':<22} {'mode':<12} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'errors':>7}"
+    print(f"{args.users} users, {args.latency_ms} ms per backend round trip")
+    print(header)
+    print("-" * len(header))
+    for name in [s for s in args.scenarios.split(",") if s]:
+        r = run_wsgi(flask_app, meta, name, args.wsgi_threads, args.requests, args.seed)
+        print(f"{name:<22} {'wsgi x' + str(args.wsgi_threads):<12} {r['throughput_rps']:>9} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['errors']:>7}")
+        for concurrency in [int(c) for c in args.concurrency.split(",") if c]:
+            r = asyncio.run(run_asgi(asgi.app, meta, name, concurrency, args.requests, args.seed))
+            print(f"{name:<22} {'asgi x' + str(concurrency):<12} {r['throughput_rps']:>9} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['errors']:>7}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
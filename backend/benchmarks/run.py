@@ -0,0 +1,197 @@
+"""
+Load-test runner for the hot endpoints against a synthetic school.
+
+    cd backend
+    python -m benchmarks.run                         # 1k, 10k and 100k users
+    python -m benchmarks.run --sizes 1000,10000 --clients 16 --requests 400
+    python -m benchmarks.run --json out.json --compare baseline.json
+
+Each dataset size runs in its own subprocess on the local datastore backend
+(DATASTORE=local, no network).  The Flask app is driven in-process by
+--clients concurrent threads, each with its own test client.  For every
+scenario we report p50/p95/p99 latency, throughput and backend reads/writes
+per request (counted by the local store).
+
+With --compare, the run fails (exit code 1) when a scenario's p95 or reads
+per request got worse than the baseline by more than --tolerance.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+SCENARIOS = (
+    "teacher_login",
+    "get_teacher_students",
+    "get_course_students",
+    "get_posts",
+    "get_posts_page",
+    "update_course_marks",
+)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def make_request(name, client, meta, rnd):
+    if name == "teacher_login":
+        t = rnd.choice(meta["teachers"])
+        return client.post("/api/teacher_login", json={"username": t["username"], "password": "pw"})
+    if name == "get_teacher_students":
+        t = rnd.choice(meta["teachers"])
+        return client.get(f"/api/teacher/{t['userId']}/students")
+    if name == "get_course_students":
+        c = rnd.choice(meta["courses"])
+        return client.get(f"/api/course/{c['courseId']}/students")
+    if name == "get_posts":
+        return client.get("/api/get_posts")
+    if name == "get_posts_page":
+        return client.get("/api/get_posts?limit=20&compact=1")
+    if name == "update_course_marks":
+        c = rnd.choice(meta["courses"])
+        updates = [{"studentId": sid, "marks": {"mark20": rnd.randint(0, 20), "mark30": rnd.randint(0, 30),
+                                                "mark50": rnd.randint(0, 50)}} for sid in c["students"]]
+        return client.post(f"/api/course/{c['courseId']}/update-marks", json={"updates": updates})
+    raise ValueError(name)
+
+
+def run_scenario(app, store, meta, name, clients, requests_total, seed):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    per_client = max(1, requests_total // clients)
+
+    def worker(index):
+        client = app.test_client()
+        rnd = random.Random(seed * 1000 + index)
+        local = []
+        for _ in range(per_client):
+            start = time.perf_counter()
+            response = make_request(name, client, meta, rnd)
+            local.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(local)
+
+    before = dict(store.stats)
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    wall = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - wall
+
+    count = len(latencies)
+    latencies.sort()
+    return {
+        "requests": count,
+        "errors": errors[0],
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "throughput_rps": round(count / wall, 1) if wall else 0.0,
+        "reads_per_request": round((store.stats["reads"] - before["reads"]) / max(count, 1), 2),
+        "writes_per_request": round((store.stats["writes"] - before["writes"]) / max(count, 1), 2),
+    }
+
+
+def run_single(size, args):
+    """Benchmark one dataset size in this process; returns {scenario: stats}."""
+    os.environ["DATASTORE"] = "local"
+    os.environ.setdefault("REQUEST_LOG", "0")
+    import datastore
+    from benchmarks.synthetic import generate_school
+
+    tree, meta = generate_school(users=size, seed=args.seed)
+    store = datastore.use_local(datastore.LocalStore(tree))
+    del tree
+
+    import app as app_module
+
+    results = {}
+    for name in args.scenarios:
+        # warm-up pass so one-off cache fills are not measured
+        run_scenario(app_module.app, store, meta, name, 1, min(5, args.requests), args.seed)
+        results[name] = run_scenario(app_module.app, store, meta, name, args.clients, args.requests, args.seed)
+    return results
+
+
+def print_report(report):
+    header = f"{'users':>8} {'scenario':<22} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'reads/req':>10} {'writes/req':>10} {'errors':>7}"
+    print(header)
+    print("-" * len(header))
+    for size, scenarios in report.items():
+        for name, r in scenarios.items():
+            print(f"{size:>8} {name:<22} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9} "
+                  f"{r['throughput_rps']:>9} {r['reads_per_request']:>10} {r['writes_per_request']:>10} {r['errors']:>7}")
+
+
+def compare(report, baseline, tolerance):
+    """Return a list of regression messages (empty when within tolerance)."""
+    problems = []
+    for size, scenarios in report.items():
+        for name, r in scenarios.items():
+            base = baseline.get(str(size), {}).get(name)
+            if not base:
+                continue
+            for metric in ("p95_ms", "reads_per_request"):
+                if base[metric] and r[metric] > base[metric] * (1 + tolerance):
+                    problems.append(f"{size} users / {name}: {metric} {base[metric]} -> {r[metric]}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma-separated user counts")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent client threads")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--compare", help="baseline report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    args.scenarios = [s for s in args.scenarios.split(",") if s]
+
+    if args.single:
+        json.dump(run_single(args.single, args), sys.stdout)
+        return 0
+
+    report = {}
+    for size in [int(s) for s in args.sizes.split(",") if s]:
+        cmd = [sys.executable, "-m", "benchmarks.run", "--single", str(size),
+               "--clients", str(args.clients), "--requests", str(args.requests),
+               "--scenarios", ",".join(args.scenarios), "--seed", str(args.seed)]
+        out = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        report[str(size)] = json.loads(out.stdout.decode().strip().splitlines()[-1])
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            problems = compare(report, json.load(f), args.tolerance)
+        for p in problems:
+            print("REGRESSION:", p)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
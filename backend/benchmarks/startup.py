@@ -0,0 +1,114 @@
+"""
+Cold start: how long a fresh worker takes to import, answer /healthz, report
+ready on /readyz and serve its first real request, per READ_CACHE_PREWARM mode.
+
+    cd backend
+    python -m benchmarks.startup
+    python -m benchmarks.startup --users 10000 --latency-ms 100 --modes sync,background,off --runs 5
+
+Every run is a fresh interpreter on the local datastore (seeded from a
+synthetic school) with every round trip delayed by --latency-ms:
+
+  sync        the cache loads while app.py is imported (the old behaviour)
+  background  the cache loads on a thread; /healthz answers right away
+  off         no prewarm; each node loads on its first request
+
+Reported per mode (median of --runs): import, first /healthz, /readyz 200
+and the first get_teacher_students request, all from interpreter start.
+
+Only the local backend is measured: no Firebase Admin SDK initialisation,
+credential exchange, TLS setup or streaming listener handshakes.  Those add
+a fixed cost on top of every column against a real database or the emulator,
+so compare modes with each other, not with production startup times.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+MODES = ("sync", "background", "off")
+READY_POLL = 0.005
+READY_TIMEOUT = 120.0
+FIELDS = ("import_s", "healthz_s", "ready_s", "first_request_s")
+
+
+def child(meta_path):
+    """Runs in the fresh interpreter: times each step from process start."""
+    started = time.perf_counter()
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from benchmarks.run import make_request
+
+    with open(meta_path) as f:
+        meta = json.load(f)
+
+    import app
+    timings = {"import_s": time.perf_counter() - started}
+    client = app.app.test_client()
+    client.get("/healthz")
+    timings["healthz_s"] = time.perf_counter() - started
+    deadline = time.monotonic() + READY_TIMEOUT
+    while client.get("/readyz").status_code != 200:
+        if time.monotonic() > deadline:
+            break
+        time.sleep(READY_POLL)
+    timings["ready_s"] = time.perf_counter() - started
+    response = make_request("get_teacher_students", client, meta, random.Random(0))
+    timings["first_request_s"] = time.perf_counter() - started
+    timings["status"] = response.status_code
+    print(json.dumps(timings))
+    os._exit(0)  # skip joining listener / prewarm threads
+
+
+def run_once(mode, seed_path, meta_path, latency_ms):
+    env = dict(os.environ, DATASTORE="local", LOCAL_DATASTORE_SEED=seed_path,
+               LOCAL_DATASTORE_LATENCY_MS=str(latency_ms), READ_CACHE_PREWARM=mode,
+               REQUEST_LOG="0", PASSWORD_HASH_WORKERS="0")
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, "-m", "benchmarks.startup", "--child", meta_path],
+                         cwd=backend, env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="simulated RTDB round trip")
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        return child(args.child)
+
+    from benchmarks.synthetic import generate_school
+
+    tree, meta = generate_school(users=args.users, seed=args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        seed_path = os.path.join(tmp, "seed.json")
+        meta_path = os.path.join(tmp, "meta.json")
+        with open(seed_path, "w") as f:
+            json.dump(tree, f)
+        with open(meta_path, "w") as f:
+            json.dump(meta, f)
+        del tree
+
+        header = f"{'mode':<12} {'import s':>9} {'healthz s':>10} {'ready s':>9} {'1st req s':>10}"
+        print(f"{args.users} users, {args.latency_ms} ms per backend round trip, median of {args.runs}")
+        print("local datastore only: Firebase SDK init, auth and listener handshakes are not included")
+        print(header)
+        print("-" * len(header))
+        for mode in [m for m in args.modes.split(",") if m]:
+            runs = [run_once(mode, seed_path, meta_path, args.latency_ms) for _ in range(args.runs)]
+            medians = [round(statistics.median(r[k] for r in runs), 3) for k in FIELDS]
+            print(f"{mode:<12} {medians[0]:>9} {medians[1]:>10} {medians[2]:>9} {medians[3]:>10}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
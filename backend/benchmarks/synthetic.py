@@ -0,0 +1,109 @@
+"""
+Synthetic school generator shaped like database_structure.txt.
+
+    generate_school(users=10000) -> (tree, meta)
+
+`tree` is a full RTDB-style JSON tree (Users, Students, Teachers, Parents,
+Courses, TeacherAssignments, ClassMarks, Posts, Indexes, counters) and `meta`
+lists the teacher logins, teacher userIds and course ids the load runner
+picks from.  Output is deterministic for a given seed.
+
+Proportions: 80% students in classes of ~40, six subjects per class, one
+teacher per six courses, the rest parents; one post per 50 users.
+"""
+import random
+
+import indexes
+
+SUBJECTS = ("math", "english", "physics", "biology", "history", "amharic")
+GRADES = [str(g) for g in range(1, 13)]
+CLASS_SIZE = 40
+COURSES_PER_TEACHER = 6
+
+
+def _section_name(i):
+    return chr(65 + i % 26) + (str(i // 26) if i >= 26 else "")
+
+
+def generate_school(users=10000, seed=0, marks_fill=1.0):
+    rnd = random.Random(seed)
+    n_students = max(CLASS_SIZE, int(users * 0.8))
+    n_classes = max(1, n_students // CLASS_SIZE)
+    sections_per_grade = max(1, -(-n_classes // len(GRADES)))
+    classes = [(g, _section_name(s)) for s in range(sections_per_grade) for g in GRADES][:n_classes]
+
+    tree = {
+        "Users": {}, "Students": {}, "Teachers": {}, "Parents": {}, "Courses": {},
+        "TeacherAssignments": {}, "ClassMarks": {}, "Posts": {}, "counters": {},
+    }
+    meta = {"teachers": [], "courses": [], "students": n_students}
+
+    def add_user(user_id, **fields):
+        tree["Users"][user_id] = {"userId": user_id, "isActive": True,
+                                  "profileImage": "/default-profile.png", **fields}
+
+    # ---------------- students ----------------
+    roster = {c: [] for c in classes}
+    for i in range(n_students):
+        grade, section = classes[i % len(classes)]
+        student_id = f"GES_{str(i + 1).zfill(4)}_26"
+        user_id = f"u_s{i}"
+        add_user(user_id, username=student_id, name=f"Student {i}", password="pw",
+                 role="student", studentId=student_id)
+        tree["Students"][student_id] = {
+            "userId": user_id, "studentId": student_id, "academicYear": "2025_2026",
+            "grade": grade, "section": section, "status": "active",
+        }
+        roster[(grade, section)].append(student_id)
+
+    # ---------------- courses, teachers, marks ----------------
+    courses = []
+    for grade, section in classes:
+        for subject in SUBJECTS:
+            course_id = f"course_{subject}_{grade}{section.upper()}"
+            tree["Courses"][course_id] = {"name": subject.title(), "subject": subject.title(),
+                                          "grade": grade, "section": section}
+            courses.append(course_id)
+            marks = {}
+            for student_id in roster[(grade, section)]:
+                if rnd.random() < marks_fill:
+                    marks[student_id] = {"mark20": rnd.randint(0, 20), "mark30": rnd.randint(0, 30),
+                                         "mark50": rnd.randint(0, 50)}
+            if marks:
+                tree["ClassMarks"][course_id] = marks
+            meta["courses"].append({"courseId": course_id, "students": roster[(grade, section)]})
+
+    n_teachers = max(1, -(-len(courses) // COURSES_PER_TEACHER))
+    for t in range(n_teachers):
+        teacher_id = f"GET_{str(t + 1).zfill(4)}_26"
+        user_id = f"u_t{t}"
+        add_user(user_id, username=teacher_id, name=f"Teacher {t}", password="pw",
+                 role="teacher", teacherId=teacher_id)
+        tree["Teachers"][teacher_id] = {"userId": user_id, "teacherId": teacher_id, "status": "active"}
+        meta["teachers"].append({"teacherKey": teacher_id, "userId": user_id, "username": teacher_id})
+    for i, course_id in enumerate(courses):
+        teacher_id = f"GET_{str(i % n_teachers + 1).zfill(4)}_26"
+        tree["TeacherAssignments"][f"a{i}"] = {"teacherId": teacher_id, "courseId": course_id}
+
+    # ---------------- parents ----------------
+    n_parents = max(0, users - n_students - n_teachers)
+    for p in range(n_parents):
+        user_id = f"u_p{p}"
+        add_user(user_id, username=f"parent{p}", name=f"Parent {p}", password="pw", role="parent")
+        child = f"GES_{str(rnd.randint(1, n_students)).zfill(4)}_26"
+        tree["Parents"][f"p{p}"] = {"userId": user_id, "status": "active",
+                                    "children": {"c0": {"studentId": child, "relationship": "parent"}}}
+
+    # ---------------- posts ----------------
+    admin_id = "u_admin"
+    add_user(admin_id, username="admin", name="School Admin", password="pw", role="admin")
+    for i in range(max(1, users // 50)):
+        likes = {f"GET_{str(rnd.randint(1, n_teachers)).zfill(4)}_26": True for _ in range(rnd.randint(0, 10))}
+        tree["Posts"][f"post{i:06d}"] = {
+            "adminId": admin_id, "message": f"Announcement {i}", "postUrl": None,
+            "time": f"2026-01-01T00:00:00.{i:06d}", "likeCount": len(likes), "likes": likes,
+        }
+
+    tree["Indexes"] = indexes.build_all(tree["Users"], tree["Teachers"], tree["Students"])
+    tree["counters"] = {"students": n_students, "teachers": n_teachers}
+    return tree, meta
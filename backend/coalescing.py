@@ -0,0 +1,222 @@
+"""
+Single-flight RTDB reads: identical concurrent get()s in a process share
+one backend round trip.
+
+datastore.reference() wraps references in CoalescingReference.  A get() (or
+a query's get()) is keyed by path, arguments and query chain; while one is
+in flight, every identical call waits for it and gets the same result (or
+the same exception) instead of issuing its own.  With
+COALESCE_MICROCACHE_MS > 0 a finished result is also reused for that long,
+which absorbs bursts such as the whole school opening the dashboard at 8:00.
+
+Writes made through a wrapped reference drop cached and in-flight entries
+that overlap the written paths, so a request reads its own writes.  Writes
+from other processes can be missed for at most the microcache window.
+
+Results are shared between callers: treat them as read-only (copy before
+modifying), as with the read cache.
+
+COALESCE_READS=0 turns the layer off.  Counters (leader / shared / cached)
+are exported on /metrics as gojo_rtdb_coalesced_reads_total.
+"""
+import os
+import threading
+import time
+
+COALESCE_READS = os.environ.get("COALESCE_READS", "1") != "0"
+COALESCE_MICROCACHE_MS = float(os.environ.get("COALESCE_MICROCACHE_MS", "0"))
+MICROCACHE_MAX_ENTRIES = 1024
+
+
+def _norm(path):
+    return "/".join(p for p in str(path or "").split("/") if p)
+
+
+def _overlaps(a, b):
+    return a == b or not a or not b or a.startswith(b + "/") or b.startswith(a + "/")
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class SingleFlight:
+    def __init__(self, ttl=COALESCE_MICROCACHE_MS / 1000.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._inflight = {}  # key -> _Call
+        self._recent = {}    # key -> (expires, value)
+        self.counters = {"leader": 0, "shared": 0, "cached": 0}
+
+    def do(self, key, fn):
+        """fn() once for every concurrent caller with the same key (key[0] is the path)."""
+        with self._lock:
+            hit = self._recent.get(key)
+            if hit is not None and hit[0] > time.monotonic():
+                self.counters["cached"] += 1
+                return hit[1]
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+                self.counters["leader"] += 1
+            else:
+                self.counters["shared"] += 1
+        if not leader:
+            return call.wait()
+
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                # not ours any more if a write invalidated it meanwhile
+                if self._inflight.get(key) is call:
+                    del self._inflight[key]
+                    if call.error is None and self.ttl > 0:
+                        self._remember(key, call.value)
+            call.done.set()
+        return call.value
+
+    def _remember(self, key, value):
+        now = time.monotonic()
+        if len(self._recent) >= MICROCACHE_MAX_ENTRIES:
+            self._recent = {k: v for k, v in self._recent.items() if v[0] > now}
+        if len(self._recent) < MICROCACHE_MAX_ENTRIES:
+            self._recent[key] = (now + self.ttl, value)
+
+    def invalidate(self, paths):
+        """Forget cached and in-flight reads overlapping any of `paths`."""
+        paths = [_norm(p) for p in paths]
+        with self._lock:
+            for table in (self._inflight, self._recent):
+                for key in [k for k in table if any(_overlaps(k[0], p) for p in paths)]:
+                    del table[key]
+
+    def prometheus_lines(self):
+        with self._lock:
+            counters = dict(self.counters)
+        lines = ["# TYPE gojo_rtdb_coalesced_reads_total counter"]
+        lines += [f'gojo_rtdb_coalesced_reads_total{{outcome="{k}"}} {v}' for k, v in sorted(counters.items())]
+        return lines
+
+
+class CoalescingQuery:
+    def __init__(self, query, flight, path, chain):
+        self._query = query
+        self._flight = flight
+        self._path = path
+        self._chain = chain
+
+    def _chain_with(self, name, *args):
+        query = getattr(self._query, name)(*args)
+        return CoalescingQuery(query, self._flight, self._path, self._chain + ((name, args),))
+
+    def start_at(self, value):
+        return self._chain_with("start_at", value)
+
+    def end_at(self, value):
+        return self._chain_with("end_at", value)
+
+    def equal_to(self, value):
+        return self._chain_with("equal_to", value)
+
+    def limit_to_first(self, limit):
+        return self._chain_with("limit_to_first", limit)
+
+    def limit_to_last(self, limit):
+        return self._chain_with("limit_to_last", limit)
+
+    def get(self):
+        return self._flight.do((self._path, "query", self._chain), self._query.get)
+
+
+class CoalescingReference:
+    def __init__(self, ref, flight):
+        self._ref = ref
+        self._flight = flight
+
+    @property
+    def key(self):
+        return self._ref.key
+
+    @property
+    def path(self):
+        return self._ref.path
+
+    @property
+    def parent(self):
+        parent = self._ref.parent
+        return CoalescingReference(parent, self._flight) if parent is not None else None
+
+    def child(self, path):
+        return CoalescingReference(self._ref.child(path), self._flight)
+
+    def get(self, *args, **kwargs):
+        key = (_norm(self._ref.path), "get", args, tuple(sorted(kwargs.items())))
+        return self._flight.do(key, lambda: self._ref.get(*args, **kwargs))
+
+    # ---------------- writes ----------------
+    def _written(self, *paths):
+        base = _norm(self._ref.path)
+        self._flight.invalidate([f"{base}/{_norm(p)}" if _norm(p) else base for p in paths])
+
+    def set(self, value):
+        try:
+            return self._ref.set(value)
+        finally:
+            self._written("")
+
+    def update(self, value):
+        try:
+            return self._ref.update(value)
+        finally:
+            self._written(*value.keys())
+
+    def delete(self):
+        try:
+            return self._ref.delete()
+        finally:
+            self._written("")
+
+    def push(self, value=""):
+        try:
+            return CoalescingReference(self._ref.push(value), self._flight)
+        finally:
+            self._written("")
+
+    def transaction(self, transaction_update):
+        try:
+            return self._ref.transaction(transaction_update)
+        finally:
+            self._written("")
+
+    # ---------------- queries ----------------
+    def order_by_child(self, path):
+        return CoalescingQuery(self._ref.order_by_child(path), self._flight,
+                               _norm(self._ref.path), (("order_by_child", (path,)),))
+
+    def order_by_key(self):
+        return CoalescingQuery(self._ref.order_by_key(), self._flight,
+                               _norm(self._ref.path), (("order_by_key", ()),))
+
+    def order_by_value(self):
+        return CoalescingQuery(self._ref.order_by_value(), self._flight,
+                               _norm(self._ref.path), (("order_by_value", ()),))
+
+    def __getattr__(self, name):
+        return getattr(self._ref, name)
+
+
+flight = SingleFlight()
@@ -0,0 +1,627 @@
+"""
+Data-access layer between the Flask handlers and the storage backend.
+
+Handlers call datastore.reference(path) / datastore.bucket() instead of
+firebase_admin directly.  Two backends share the firebase_admin Reference
+API (child/get/set/update/push/delete/transaction/order_by_*/listen):
+
+  firebase  (default) the real Realtime Database and Cloud Storage bucket
+  local     an in-process JSON tree plus an in-memory bucket, for offline
+            load tests and benchmarks (no credentials, no network)
+
+Pick one with DATASTORE=firebase|local.  The local tree can be seeded from a
+JSON export with LOCAL_DATASTORE_SEED=<file> (e.g. an RTDB "Export JSON"), and
+LOCAL_DATASTORE_LATENCY_MS=<n> makes every local round trip take n ms, like a
+call to the real database would.
+Both backends are wrapped by instrumentation.py, which attributes every call
+to the current request.
+
+Inside use_prefetched(values) plain get()s of the paths in `values` are served
+from that dict: the async gateway (asgi.py) reads them ahead of the handler.
+"""
+import asyncio
+import contextlib
+import contextvars
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+import coalescing
+import instrumentation
+
+BACKEND = os.environ.get("DATASTORE", "firebase").lower()
+
+DATABASE_URL = "https://ethiostore-17d9f-default-rtdb.firebaseio.com/"
+STORAGE_BUCKET = "ethiostore-17d9f.appspot.com"
+
+_local_store = None
+
+# {path: value} read ahead of time for the current request, see use_prefetched()
+_prefetched = contextvars.ContextVar("prefetched", default=None)
+
+
+def is_local():
+    return BACKEND == "local"
+
+
+def init_firebase(credential_path):
+    import firebase_admin
+    from firebase_admin import credentials
+
+    cred = credentials.Certificate(credential_path)
+    firebase_admin.initialize_app(cred, {
+        "databaseURL": DATABASE_URL,
+        "storageBucket": STORAGE_BUCKET
+    })
+
+
+# ---------------- lazy Firebase initialization ----------------
+# Importing firebase_admin and parsing the service account takes a good part
+# of a cold start; it now happens on the first reference() / bucket() call
+# (or in the background prewarm) instead of at import.
+_firebase_lock = threading.Lock()
+_firebase = {"credential": None, "initialized": False, "error": None}
+
+
+def configure_firebase(credential_path):
+    """Record the service-account file; the SDK is initialized on first use."""
+    _firebase["credential"] = credential_path
+
+
+def ensure_firebase():
+    """Initialize the Firebase app once, whichever thread gets here first."""
+    if _firebase["initialized"]:
+        return
+    with _firebase_lock:
+        if _firebase["initialized"]:
+            return
+        path = _firebase["credential"]
+        try:
+            if not path or not os.path.exists(path):
+                raise RuntimeError(f"Firebase credential file not found: {path}")
+            init_firebase(path)
+        except Exception as e:
+            _firebase["error"] = str(e)
+            raise
+        _firebase["initialized"] = True
+        _firebase["error"] = None
+
+
+def is_rejected(error):
+    """True when RTDB refused the data itself (bad key, bad value): retrying cannot help."""
+    if isinstance(error, ValueError):
+        return True
+    try:
+        from firebase_admin.exceptions import InvalidArgumentError
+    except ImportError:
+        return False
+    return isinstance(error, InvalidArgumentError)
+
+
+def is_missing_index(error):
+    """True for RTDB's 400 on an ordered query without an ".indexOn" rule for it."""
+    try:
+        from firebase_admin.exceptions import InvalidArgumentError
+    except ImportError:
+        return False
+    return isinstance(error, InvalidArgumentError) and "index" in str(error).lower()
+
+
+def backend_status():
+    """For /readyz: which backend, and whether it can be used yet."""
+    if is_local():
+        return {"backend": "local", "initialized": True, "error": None}
+    return {"backend": "firebase", "initialized": _firebase["initialized"], "error": _firebase["error"]}
+
+
+def use_local(store=None):
+    """Switch this process to the local backend (optionally with a prepared store)."""
+    global BACKEND, _local_store
+    BACKEND = "local"
+    _local_store = store or LocalStore()
+    return _local_store
+
+
+def local_store():
+    global _local_store
+    if _local_store is None:
+        _local_store = LocalStore(
+            seed_path=os.environ.get("LOCAL_DATASTORE_SEED"),
+            latency=float(os.environ.get("LOCAL_DATASTORE_LATENCY_MS", "0")) / 1000.0,
+        )
+    return _local_store
+
+
+def reference(path="/", coalesce=True):
+    """
+    Instrumented reference; identical concurrent reads share one round trip
+    (coalescing.py) unless `coalesce` is False, for callers that modify
+    what they read.
+    """
+    if is_local():
+        ref = instrumentation.wrap_reference(local_store().reference(path))
+    else:
+        ensure_firebase()
+        from firebase_admin import db
+        ref = instrumentation.wrap_reference(db.reference(path))
+    if coalesce and coalescing.COALESCE_READS:
+        ref = coalescing.CoalescingReference(ref, coalescing.flight)
+    values = _prefetched.get()
+    return PrefetchedReference(ref, values) if values else ref
+
+
+instrumentation.metrics.register(coalescing.flight.prometheus_lines)
+
+
+def bucket():
+    if is_local():
+        return instrumentation.wrap_bucket(local_store().bucket)
+    ensure_firebase()
+    from firebase_admin import storage
+    return instrumentation.wrap_bucket(storage.bucket())
+
+
+def increment(delta=1):
+    """Server value: add `delta` to the number stored at the path (0 when absent)."""
+    return {".sv": {"increment": delta}}
+
+
+def normalize_path(path):
+    return "/".join(_split(path))
+
+
+@contextlib.contextmanager
+def use_prefetched(values):
+    """Serve plain get()s of the paths in `values` ({path: value}) from memory."""
+    token = _prefetched.set({normalize_path(p): v for p, v in values.items()})
+    try:
+        yield
+    finally:
+        _prefetched.reset(token)
+
+
+class PrefetchedReference:
+    """Reference whose plain get() is answered from a prefetched {path: value} map."""
+
+    def __init__(self, ref, values):
+        self._ref = ref
+        self._values = values
+
+    def child(self, path):
+        return PrefetchedReference(self._ref.child(path), self._values)
+
+    def get(self, *args, **kwargs):
+        if not args and not kwargs:
+            path = normalize_path(self._ref.path)
+            if path in self._values:
+                return self._values[path]
+        return self._ref.get(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._ref, name)
+
+
+# =====================================================================
+# Local backend
+# =====================================================================
+# characters RTDB refuses in keys ("/" separates them)
+INVALID_KEY_CHARS = set(".$#[]")
+
+
+def _split(path):
+    return [p for p in str(path or "").split("/") if p]
+
+
+def _normalize(value):
+    """JSON round trip + RTDB storage rules: lists become int-keyed maps, empty maps vanish."""
+    if isinstance(value, (list, tuple)):
+        value = {str(i): v for i, v in enumerate(value)}
+    if isinstance(value, dict):
+        out = {}
+        for k, v in value.items():
+            v = _normalize(v)
+            if v is not None:
+                out[str(k)] = v
+        return out or None
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return json.loads(json.dumps(value))
+
+
+def _export(value):
+    """Copy a stored value out, turning dense int-keyed maps back into lists (as RTDB does)."""
+    if not isinstance(value, dict):
+        return value
+    out = {k: _export(v) for k, v in value.items()}
+    if out and all(k.isdigit() and (k == "0" or not k.startswith("0")) for k in out):
+        top = max(int(k) for k in out)
+        if len(out) > (top + 1) / 2:
+            return [out.get(str(i)) for i in range(top + 1)]
+    return out
+
+
+def _etag(value):
+    return hashlib.md5(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+
+def _order_key(value):
+    """RTDB ordering: null < false < true < numbers < strings < objects."""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, int(value))
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, str):
+        return (3, value)
+    return (4, 0)
+
+
+class LocalEvent:
+    def __init__(self, event_type, path, data):
+        self.event_type = event_type
+        self.path = path
+        self.data = data
+
+
+class LocalListenerRegistration:
+    def __init__(self, store, path, callback):
+        self._store = store
+        self.path = path
+        self.callback = callback
+
+    def close(self):
+        self._store._remove_listener(self)
+
+
+class LocalStore:
+    def __init__(self, data=None, seed_path=None, latency=0.0):
+        self.latency = latency  # seconds added to every round trip
+        self._lock = threading.RLock()
+        self._root = {}
+        self._listeners = []
+        self.bucket = LocalBucket()
+        # backend operations served, like RTDB's usage counters (used by benchmarks)
+        self.stats = {"reads": 0, "writes": 0}
+        if seed_path:
+            with open(seed_path, encoding="utf-8") as f:
+                data = json.load(f)
+        if data:
+            self._root = _normalize(data) or {}
+
+    def reference(self, path="/"):
+        return LocalReference(self, _split(path))
+
+    def dump(self):
+        return self._read([])
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.dump(), f)
+
+    def _round_trip(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _get(self, parts):
+        with self._lock:
+            self.stats["reads"] += 1
+            return _export(self._node(parts))
+
+    async def get_async(self, path):
+        """Plain get for the async gateway: waits out `latency` without blocking the loop."""
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._get(_split(path))
+
+    # ---------------- raw tree access ----------------
+    def _node(self, parts):
+        """The stored (not copied) value at `parts`; caller holds the lock."""
+        node = self._root
+        for p in parts:
+            if not isinstance(node, dict) or p not in node:
+                return None
+            node = node[p]
+        return node
+
+    def _read(self, parts):
+        """Exported copy of the value at `parts` (None if absent)."""
+        with self._lock:
+            return _export(self._node(parts))
+
+    def _write_locked(self, parts, value):
+        if not parts:
+            self._root = value or {}
+            return
+        node = self._root
+        trail = []
+        for p in parts[:-1]:
+            if not isinstance(node.get(p), dict):
+                if value is None:
+                    return
+                node[p] = {}
+            trail.append((node, p))
+            node = node[p]
+        if value is None:
+            node.pop(parts[-1], None)
+        else:
+            node[parts[-1]] = value
+        # prune maps emptied by a delete
+        for parent, key in reversed(trail):
+            if parent[key]:
+                break
+            del parent[key]
+
+    def _resolve_server_values(self, parts, value):
+        """Replace {".sv": ...} placeholders (increment, timestamp) like the server does."""
+        if not isinstance(value, dict):
+            return value
+        if set(value) == {".sv"}:
+            sv = value[".sv"]
+            if sv == "timestamp":
+                return int(time.time() * 1000)
+            current = self._node(parts)
+            if isinstance(current, bool) or not isinstance(current, (int, float)):
+                current = 0
+            return current + sv["increment"]
+        return {k: self._resolve_server_values(parts + [k], v) for k, v in value.items()}
+
+    def _write(self, writes):
+        """Apply [(parts, value), ...] atomically, then notify listeners."""
+        writes = [(parts, _normalize(value)) for parts, value in writes]
+        with self._lock:
+            self.stats["writes"] += 1
+            for parts, value in writes:
+                self._write_locked(parts, self._resolve_server_values(parts, value))
+            listeners = list(self._listeners)
+        self._notify(listeners, [parts for parts, _ in writes])
+
+    def _transaction(self, parts, fn):
+        with self._lock:
+            self.stats["writes"] += 1
+            current = self._read(parts)
+            new_value = _normalize(fn(current))
+            self._write_locked(parts, new_value)
+            listeners = list(self._listeners)
+        self._notify(listeners, [parts])
+        return _export(new_value)
+
+    # ---------------- listeners ----------------
+    def _listen(self, parts, callback):
+        self._round_trip()  # the initial snapshot
+        registration = LocalListenerRegistration(self, parts, callback)
+        with self._lock:
+            self._listeners.append(registration)
+            snapshot = self._read(parts)
+        callback(LocalEvent("put", "/", snapshot))
+        return registration
+
+    def _remove_listener(self, registration):
+        with self._lock:
+            if registration in self._listeners:
+                self._listeners.remove(registration)
+
+    def _notify(self, listeners, written):
+        for registration in listeners:
+            base = registration.path
+            for parts in written:
+                if parts[:len(base)] == base:
+                    rel = parts[len(base):]
+                    event = LocalEvent("put", "/" + "/".join(rel), self._read(parts))
+                elif base[:len(parts)] == parts:
+                    event = LocalEvent("put", "/", self._read(base))
+                else:
+                    continue
+                try:
+                    registration.callback(event)
+                except Exception:
+                    pass
+
+
+class LocalReference:
+    def __init__(self, store, parts):
+        self._store = store
+        self._parts = list(parts)
+
+    @property
+    def key(self):
+        return self._parts[-1] if self._parts else None
+
+    @property
+    def path(self):
+        return "/" + "/".join(self._parts)
+
+    @property
+    def parent(self):
+        return LocalReference(self._store, self._parts[:-1]) if self._parts else None
+
+    def child(self, path):
+        if not path or not isinstance(path, str):
+            raise ValueError("Invalid path argument: {0}".format(path))
+        return LocalReference(self._store, self._parts + _split(path))
+
+    def get(self, etag=False, shallow=False):
+        self._store._round_trip()
+        value = self._store._get(self._parts)
+        if shallow and isinstance(value, (dict, list)):
+            items = value.items() if isinstance(value, dict) else enumerate(value)
+            value = {str(k): (True if isinstance(v, (dict, list)) else v) for k, v in items if v is not None}
+        if etag:
+            return value, _etag(value)
+        return value
+
+    def get_if_changed(self, etag):
+        """(changed, value, etag) like firebase_admin: (False, None, None) if `etag` is current."""
+        self._store._round_trip()
+        value = self._store._get(self._parts)
+        current = _etag(value)
+        if current == etag:
+            return False, None, None
+        return True, value, current
+
+    def set(self, value):
+        if value is None:
+            raise ValueError("Value must not be None.")
+        self._store._round_trip()
+        self._store._write([(self._parts, value)])
+
+    def update(self, value):
+        if not value or not isinstance(value, dict):
+            raise ValueError("Value argument must be a non-empty dictionary.")
+        if None in value.keys():
+            raise ValueError("Dictionary must not contain None keys.")
+        self._store._round_trip()
+        # like RTDB: one bad key rejects the whole multi-path update
+        bad = [k for k in value if INVALID_KEY_CHARS & set(str(k))]
+        if bad:
+            raise ValueError("Invalid key in update: {0}".format(bad[0]))
+        self._store._write([(self._parts + _split(k), v) for k, v in value.items()])
+
+    def push(self, value=""):
+        if value is None:
+            raise ValueError("Value must not be None.")
+        ref = self.child(push_key())
+        ref.set(value)
+        return ref
+
+    def delete(self):
+        self._store._round_trip()
+        self._store._write([(self._parts, None)])
+
+    def transaction(self, transaction_update):
+        if not callable(transaction_update):
+            raise ValueError("transaction_update must be a function.")
+        self._store._round_trip()
+        return self._store._transaction(self._parts, transaction_update)
+
+    def listen(self, callback):
+        return self._store._listen(self._parts, callback)
+
+    def order_by_child(self, path):
+        return LocalQuery(self, lambda k, v: self._child_value(v, path))
+
+    def order_by_key(self):
+        return LocalQuery(self, lambda k, v: k)
+
+    def order_by_value(self):
+        return LocalQuery(self, lambda k, v: v)
+
+    @staticmethod
+    def _child_value(value, path):
+        for p in _split(path):
+            if not isinstance(value, dict):
+                return None
+            value = value.get(p)
+        return value
+
+
+class LocalQuery:
+    def __init__(self, ref, extract):
+        self._ref = ref
+        self._extract = extract
+        self._start = self._end = self._equal = None
+        self._first = self._last = None
+
+    def start_at(self, start):
+        self._start = start
+        return self
+
+    def end_at(self, end):
+        self._end = end
+        return self
+
+    def equal_to(self, value):
+        self._equal = value
+        return self
+
+    def limit_to_first(self, limit):
+        self._first = limit
+        return self
+
+    def limit_to_last(self, limit):
+        self._last = limit
+        return self
+
+    def get(self):
+        # Filter and sort the stored children, copy out only the result
+        # (like the server side of an RTDB query).
+        store = self._ref._store
+        store._round_trip()
+        with store._lock:
+            store.stats["reads"] += 1
+            node = store._node(self._ref._parts)
+            if not isinstance(node, dict):
+                return {}
+            items = sorted(node.items(), key=lambda kv: (_order_key(self._extract(*kv)), kv[0]))
+            if self._equal is not None:
+                items = [kv for kv in items if self._extract(*kv) == self._equal]
+            if self._start is not None:
+                items = [kv for kv in items if _order_key(self._extract(*kv)) >= _order_key(self._start)]
+            if self._end is not None:
+                items = [kv for kv in items if _order_key(self._extract(*kv)) <= _order_key(self._end)]
+            if self._first is not None:
+                items = items[:self._first]
+            if self._last is not None:
+                items = items[-self._last:] if self._last else []
+            return {k: _export(v) for k, v in items}
+
+
+# ---------------- push keys ----------------
+PUSH_CHARS = "-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz"
+
+
+def push_key():
+    """A Firebase-style chronological push key, generated without a round trip."""
+    now = int(time.time() * 1000)
+    stamp = ""
+    for _ in range(8):
+        stamp = PUSH_CHARS[now % 64] + stamp
+        now //= 64
+    return stamp + "".join(random.choice(PUSH_CHARS) for _ in range(12))
+
+
+def push_key_time(key):
+    """Seconds since the epoch encoded in the first 8 characters of a push key."""
+    millis = 0
+    for c in key[:8]:
+        millis = millis * 64 + PUSH_CHARS.index(c)
+    return millis / 1000.0
+
+
+# ---------------- storage ----------------
+class LocalBlob:
+    def __init__(self, bucket, name):
+        self._bucket = bucket
+        self.name = name
+        self.cache_control = None
+        self.content_type = None
+
+    @property
+    def public_url(self):
+        return f"/local-storage/{self.name}"
+
+    def exists(self):
+        return self.name in self._bucket.objects
+
+    def upload_from_string(self, data, content_type="text/plain"):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.content_type = content_type
+        self._bucket.objects[self.name] = data
+
+    def upload_from_file(self, file_obj, content_type=None):
+        self.upload_from_string(file_obj.read(), content_type=content_type)
+
+    def make_public(self):
+        pass
+
+
+class LocalBucket:
+    def __init__(self):
+        self.objects = {}
+
+    def blob(self, name):
+        return LocalBlob(self, name)
@@ -0,0 +1,174 @@
+"""
+Class statistics for one course's gradebook (ClassMarks/<courseId>).
+
+The subtree is loaded once into a column per mark field (a NumPy array when
+NumPy is installed, plain lists otherwise) and every statistic is computed
+over whole columns: mean, median, standard deviation, percentiles, a
+histogram per field, and each student's total with its rank.
+
+Results are cached per course under RTDB's ETag of the course's marks
+(app.class_marks): any write, from this backend or the admin app, changes
+the ETag, so a stale entry is never served and no explicit invalidation is
+needed.
+"""
+import math
+import os
+import threading
+from collections import Counter, OrderedDict
+
+try:
+    import numpy as np
+except ImportError:  # optional: pure-Python columns
+    np = None
+
+MARK_LIMITS = {"mark20": 20, "mark30": 30, "mark50": 50}
+TOTAL = "total"
+PERCENTILES = (10, 25, 50, 75, 90)
+DEFAULT_BINS = 10
+MAX_BINS = 50
+
+GRADEBOOK_STATS_CACHE_SIZE = int(os.environ.get("GRADEBOOK_STATS_CACHE_SIZE", "256"))
+
+
+def _number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return 0.0
+    return float(value)
+
+
+def load_columns(course_marks):
+    """(student ids, {field: column}) with the total column; missing marks count as 0."""
+    rows = [(sid, m) for sid, m in sorted((course_marks or {}).items()) if isinstance(m, dict)]
+    student_ids = [sid for sid, _ in rows]
+    columns = {f: [_number(m.get(f, 0)) for _, m in rows] for f in MARK_LIMITS}
+    if np is not None:
+        columns = {f: np.asarray(col, dtype=np.float64) for f, col in columns.items()}
+        columns[TOTAL] = sum(columns[f] for f in MARK_LIMITS) if rows else np.zeros(0)
+    else:
+        columns[TOTAL] = [sum(vals) for vals in zip(*(columns[f] for f in MARK_LIMITS))]
+    return student_ids, columns
+
+
+# ---------------- pure-Python fallbacks ----------------
+def _percentile(sorted_values, q):
+    """Linear interpolation between closest ranks (NumPy's default method)."""
+    position = (len(sorted_values) - 1) * q / 100.0
+    low = math.floor(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+
+def _histogram(values, bins, upper):
+    width = upper / bins
+    counts = [0] * bins
+    for v in values:
+        if 0 <= v <= upper:
+            counts[min(int(v / width), bins - 1)] += 1
+    return counts
+
+
+def _column_stats(column, bins, upper):
+    if np is not None:
+        percentiles = np.percentile(column, PERCENTILES).tolist()
+        counts, _ = np.histogram(column, bins=bins, range=(0, upper))
+        stats = {
+            "mean": float(column.mean()),
+            "std": float(column.std()),
+            "min": float(column.min()),
+            "max": float(column.max()),
+        }
+        counts = counts.tolist()
+    else:
+        ordered = sorted(column)
+        n = len(ordered)
+        mean = sum(ordered) / n
+        percentiles = [_percentile(ordered, q) for q in PERCENTILES]
+        counts = _histogram(ordered, bins, upper)
+        stats = {
+            "mean": mean,
+            "std": math.sqrt(sum((v - mean) ** 2 for v in ordered) / n),
+            "min": ordered[0],
+            "max": ordered[-1],
+        }
+    stats = {k: round(v, 2) for k, v in stats.items()}
+    stats["median"] = round(percentiles[PERCENTILES.index(50)], 2)
+    stats["percentiles"] = {f"p{q}": round(v, 2) for q, v in zip(PERCENTILES, percentiles)}
+    stats["histogram"] = {
+        "edges": [round(upper * i / bins, 2) for i in range(bins + 1)],
+        "counts": [int(c) for c in counts],
+    }
+    return stats
+
+
+def _ranks(totals):
+    """Competition ranks (1, 2, 2, 4) by total, highest first."""
+    if np is not None:
+        order = np.argsort(-totals, kind="stable")
+        ordered = totals[order]
+        # first index of each run of equal totals, +1
+        starts = np.r_[0, np.flatnonzero(ordered[1:] != ordered[:-1]) + 1]
+        run_rank = np.repeat(starts + 1, np.diff(np.r_[starts, len(ordered)]))
+        ranks = np.empty(len(totals), dtype=np.int64)
+        ranks[order] = run_rank
+        return ranks.tolist()
+    order = sorted(range(len(totals)), key=lambda i: -totals[i])
+    ranks = [0] * len(totals)
+    for position, i in enumerate(order):
+        previous = order[position - 1] if position else None
+        same = previous is not None and totals[previous] == totals[i]
+        ranks[i] = ranks[previous] if same else position + 1
+    return ranks
+
+
+def compute(course_marks, bins=DEFAULT_BINS):
+    """All statistics for one ClassMarks/<courseId> subtree."""
+    student_ids, columns = load_columns(course_marks)
+    count = len(student_ids)
+    if not count:
+        return {"count": 0, "fields": {}, "ranking": []}
+
+    limits = dict(MARK_LIMITS, **{TOTAL: sum(MARK_LIMITS.values())})
+    fields = {f: _column_stats(columns[f], bins, upper) for f, upper in limits.items()}
+
+    totals = columns[TOTAL]
+    ranks = _ranks(totals)
+    totals = totals.tolist() if np is not None else totals
+    ties = Counter(totals)
+    ranking = sorted(
+        ({
+            "studentId": sid,
+            "total": round(total, 2),
+            "rank": rank,
+            # share of the class scoring strictly below this student
+            "percentile": round(100.0 * (count - (rank - 1) - ties[total]) / count, 1),
+        } for sid, total, rank in zip(student_ids, totals, ranks)),
+        key=lambda r: (r["rank"], r["studentId"]),
+    )
+    return {"count": count, "fields": fields, "ranking": ranking}
+
+
+# ---------------- cache ----------------
+class StatsCache:
+    """Small LRU of computed stats keyed by (courseId, version token, bins)."""
+
+    def __init__(self, size=GRADEBOOK_STATS_CACHE_SIZE):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key, load):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        value = load()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return value
@@ -0,0 +1,118 @@
+"""
+Conditional GET (ETag / Last-Modified / 304) for the dashboard's polled reads.
+
+Write endpoints bump a version token under Versions/<kind>/<key> in the same
+multi-path update as the data they change, e.g.
+
+    Versions/lessonPlans/<teacherId>
+
+Versions is one of the read cache's nodes, so looking a token up is a memory
+read: when the client's If-None-Match still names the current token the
+request is answered with 304 before the view (and its backend reads) runs.
+
+A token only moves when this backend writes.  Data the admin app edits too
+needs a version it cannot miss instead: a hash of the read cache records the
+view returns (records_version, e.g. a teacher's courses), or RTDB's own ETag
+of the subtree (e.g. a course's marks).
+
+Scopes with neither (Posts) fall back to an ETag over the response body: the
+client still gets a 304 and skips the download, but the view runs.
+
+Tokens are push keys, so they also carry the time of the write, which is
+sent as Last-Modified.  Only If-None-Match is used to answer 304: a
+one-second Last-Modified cannot tell two writes in the same second apart.
+"""
+import functools
+import hashlib
+import json
+from email.utils import formatdate
+
+import datastore
+import indexes
+
+VERSIONS_NODE = "Versions"
+
+# Bump when the JSON shape of a conditional endpoint changes, so clients
+# holding an old body do not get a 304 for it.
+ETAG_SALT = "1"
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def version_entries(kind, *keys):
+    """Multi-path update fragment giving each (kind, key) scope a new token."""
+    token = datastore.push_key()
+    return {f"{VERSIONS_NODE}/{kind}/{indexes.encode_key(key)}": token for key in keys if key}
+
+
+def records_version(records):
+    """Version string of JSON-like records (e.g. read cache entries): changes whenever they do."""
+    data = json.dumps(records, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(data.encode()).hexdigest()[:16]
+
+
+class Versions:
+    def __init__(self, cache):
+        self.cache = cache
+
+    def get(self, kind, key):
+        scope = self.cache.get(VERSIONS_NODE).get(kind) or {}
+        return scope.get(indexes.encode_key(key))
+
+    def bump(self, kind, *keys):
+        updates = version_entries(kind, *keys)
+        if updates:
+            datastore.reference().update(updates)
+            self.cache.apply_update(updates)
+
+    def conditional(self, scope=None, version=None):
+        """
+        Decorate a GET view with ETag / Last-Modified / Cache-Control and 304
+        handling.  `scope(**view_args)` returns the (kind, key) whose version
+        token identifies the response; `version(**view_args)` returns such a
+        version string itself.  Without either the body is hashed.
+        """
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                from flask import make_response, request
+
+                token = self.get(*scope(**kwargs)) if scope else None
+                tag = token or (version(**kwargs) if version else None)
+                if tag:
+                    etag = _etag(tag, request.full_path)
+                    if request.if_none_match.contains_weak(etag):
+                        return _not_modified(etag, token)
+
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                if not tag:
+                    etag = _etag(hashlib.sha1(response.get_data()).hexdigest()[:16], request.full_path)
+                    if request.if_none_match.contains_weak(etag):
+                        return _not_modified(etag, None)
+                _set_headers(response, etag, token)
+                return response
+            return wrapper
+        return decorator
+
+
+def _etag(version, full_path):
+    """Opaque tag (sent weak, as compression may change the bytes)."""
+    digest = hashlib.sha1(f"{ETAG_SALT}:{full_path}".encode()).hexdigest()[:8]
+    return f"{version}.{digest}"
+
+
+def _set_headers(response, etag, token):
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    if token:
+        response.headers["Last-Modified"] = formatdate(datastore.push_key_time(token), usegmt=True)
+
+
+def _not_modified(etag, token):
+    from flask import Response
+
+    response = Response(status=304)
+    _set_headers(response, etag, token)
+    return response
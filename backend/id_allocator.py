@@ -0,0 +1,168 @@
+"""
+Sequential GES_/GET_ ID allocation on top of a transactional RTDB counter.
+
+IDs look like <PREFIX>_<zero-padded-4+>_<YY>, e.g. GES_0001_26.  The counter
+at counters/<kind> is the only source of truth: allocating never scans the
+Students/Teachers trees.  A worker may reserve a block of sequence numbers in
+one transaction and hand them out locally (block_size > 1); unused numbers
+of a block are simply skipped when the process exits.
+
+Bringing a counter up to the highest ID already stored is a one-off
+migration (`flask sync-id-counters`), not something every request pays for.
+A bulk block (allocate_block) is still probed with one key-range query
+before it is handed out: if the counter lags and some IDs of the block are
+taken, the counter is re-synced and a new block reserved, so an import never
+overwrites existing records.
+"""
+import logging
+import os
+import threading
+from datetime import datetime
+
+import datastore
+
+log = logging.getLogger(__name__)
+
+MAX_COLLISIONS = 10
+
+
+def year_suffix(now=None):
+    return str((now or datetime.utcnow()).year)[-2:]
+
+
+def format_id(prefix, seq, suffix=None):
+    return f"{prefix}_{str(seq).zfill(4)}_{suffix or year_suffix()}"
+
+
+def parse_seq(value, prefix):
+    """Return the sequence number of an ID like GES_0012_26, or None."""
+    if not value or not value.startswith(prefix + "_"):
+        return None
+    parts = value.split("_")
+    if len(parts) < 3:
+        return None
+    try:
+        return int(parts[1].lstrip("0") or "0")
+    except ValueError:
+        return None
+
+
+def fallback_id(prefix):
+    """Timestamp-based ID used only if the counter is unreachable."""
+    return f"{prefix}_{str(int(datetime.utcnow().timestamp()))[-6:]}_{year_suffix()}"
+
+
+class IdAllocator:
+    def __init__(self, prefix, counter_path, node, id_field, block_size=1, legacy_paths=()):
+        self.prefix = prefix
+        self.counter_path = counter_path
+        self.node = node
+        self.id_field = id_field
+        self.block_size = max(1, int(block_size))
+        self.legacy_paths = tuple(legacy_paths)  # older counters sync_counter() also honours
+
+        self._lock = threading.Lock()
+        self._next = 0   # next unused sequence number of the local block
+        self._end = 0    # last sequence number of the local block
+
+    def reserve_block(self, count):
+        """Atomically reserve `count` sequence numbers; returns (first, last)."""
+        last = datastore.reference(self.counter_path).transaction(lambda curr: (curr or 0) + count)
+        last = int(last)
+        return last - count + 1, last
+
+    def next_seq(self):
+        with self._lock:
+            if self._next == 0 or self._next > self._end:
+                self._next, self._end = self.reserve_block(self.block_size)
+            seq = self._next
+            self._next += 1
+            return seq
+
+    def exists(self, new_id):
+        return datastore.reference(self.node).child(new_id).get(shallow=True) is not None
+
+    def allocate(self, taken=None):
+        """
+        Return a fresh ID.  Each candidate costs one existence point-check
+        (plus `taken(candidate)` when given, e.g. a username check).
+        """
+        try:
+            for _ in range(MAX_COLLISIONS):
+                candidate = format_id(self.prefix, self.next_seq())
+                if not self.exists(candidate) and not (taken and taken(candidate)):
+                    return candidate
+        except Exception:
+            pass
+        return fallback_id(self.prefix)
+
+    def allocate_block(self, count):
+        """
+        Reserve `count` consecutive IDs in one transaction.  The block is
+        probed first; if any ID is already stored the counter is re-synced
+        and a fresh block reserved.  Raises RuntimeError if that one is taken too.
+        """
+        if count <= 0:
+            return []
+        for attempt in range(2):
+            first, last = self.reserve_block(count)
+            suffix = year_suffix()
+            ids = [format_id(self.prefix, seq, suffix) for seq in range(first, last + 1)]
+            taken = self.taken(ids)
+            if not taken:
+                return ids
+            log.warning("id allocator: %d IDs of %s..%s already exist in %s, re-syncing %s",
+                        len(taken), ids[0], ids[-1], self.node, self.counter_path)
+            if attempt == 0:
+                self.sync_counter()
+        raise RuntimeError(f"IDs {ids[0]}..{ids[-1]} already exist in {self.node}; "
+                           f"run `flask sync-id-counters`")
+
+    def taken(self, ids):
+        """The IDs of `ids` already stored under `node` (one key-range query per ID width)."""
+        by_width = {}
+        for new_id in ids:
+            by_width.setdefault(len(new_id), set()).add(new_id)
+        taken = set()
+        for group in by_width.values():
+            # same prefix, suffix and width: key order is sequence order
+            found = (datastore.reference(self.node).order_by_key()
+                     .start_at(min(group)).end_at(max(group)).get()) or {}
+            taken.update(key for key in found if key in group)
+        return taken
+
+    # ---------------- migration ----------------
+    def sync_counter(self, legacy_paths=None):
+        """
+        Move the counter up to the highest ID stored under `node` (and any
+        legacy counter).  Never moves it down.  Returns the new counter value.
+        """
+        if legacy_paths is None:
+            legacy_paths = self.legacy_paths
+        max_found = 0
+        records = datastore.reference(self.node).get() or {}
+        for key, record in records.items():
+            value = record.get(self.id_field) if isinstance(record, dict) else None
+            for candidate in (key, value):
+                seq = parse_seq(candidate, self.prefix)
+                if seq and seq > max_found:
+                    max_found = seq
+        for path in legacy_paths:
+            legacy = datastore.reference(path).get()
+            if isinstance(legacy, int) and legacy > max_found:
+                max_found = legacy
+
+        return datastore.reference(self.counter_path).transaction(
+            lambda curr: max(curr or 0, max_found)
+        )
+
+
+def from_env():
+    """Return (student_allocator, teacher_allocator) configured from ID_BLOCK_SIZE."""
+    block_size = int(os.environ.get("ID_BLOCK_SIZE", "1"))
+    return (
+        # Users_counters/students was used by an older /generate/student_id
+        IdAllocator("GES", "counters/students", "Students", "studentId", block_size,
+                    legacy_paths=("Users_counters/students",)),
+        IdAllocator("GET", "counters/teachers", "Teachers", "teacherId", block_size),
+    )
@@ -0,0 +1,154 @@
+"""
+Background profile image pipeline.
+
+Registration used to upload the raw phone photo to Storage inside the request
+and then serve those multi-megabyte files to every dashboard.  Now the
+request only reads the bytes and hands them to ImagePipeline.submit(); a small
+worker pool then:
+
+  1. hashes the content and reuses an earlier upload of the same bytes,
+  2. uploads the original plus resized WebP variants (when Pillow is
+     installed; without it only the original is stored),
+  3. patches profileImage / profileImageThumb on the given RTDB records.
+
+Objects are content-addressed (profiles/<sha256>/...), so they are cached
+by clients and CDNs forever.
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import datastore
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional: originals are still uploaded
+    Image = None
+
+log = logging.getLogger(__name__)
+
+PLACEHOLDER_URL = "/default-profile.png"
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# recently stored uploads remembered by content hash (a re-upload skips Storage)
+DONE_CACHE_SIZE = 1024
+
+# variant name -> longest edge in pixels
+VARIANTS = {"medium": 512, "thumb": 128}
+
+
+def resize_variants(data, variants=VARIANTS):
+    """Return {name: webp bytes} for every variant, or {} if not an image / no Pillow."""
+    if Image is None:
+        return {}
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img = ImageOps.exif_transpose(img)
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+            out = {}
+            for name, edge in variants.items():
+                copy = img.copy()
+                copy.thumbnail((edge, edge))
+                buf = io.BytesIO()
+                copy.save(buf, "WEBP", quality=80, method=4)
+                out[name] = buf.getvalue()
+            return out
+    except Exception as e:
+        log.warning("image pipeline: cannot resize upload (%s)", e)
+        return {}
+
+
+class ImagePipeline:
+    def __init__(self, get_bucket, max_workers=2, done_cache_size=DONE_CACHE_SIZE):
+        self._get_bucket = get_bucket
+        self._done_cache_size = done_cache_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image")
+        self._lock = threading.Lock()
+        self._done = OrderedDict()  # sha256 -> {"profileImage": ...}, least recently used first
+        self._pending = {}   # sha256 -> Future of the upload of that content
+
+    def submit(self, data, content_type, targets, on_done=None):
+        """
+        Queue an upload of `data` and return the placeholder URL to store now.
+        `targets` are RTDB record paths (e.g. "Users/<userId>") that get the
+        final URLs; on_done(urls) runs after they are patched.
+        """
+        if not data:
+            return PLACEHOLDER_URL
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            future = self._pending.get(digest)
+            if future is None:
+                future = self._executor.submit(self._upload, digest, data, content_type)
+                self._pending[digest] = future
+        future.add_done_callback(lambda f: self._patch(f, targets, on_done))
+        return PLACEHOLDER_URL
+
+    def _upload(self, digest, data, content_type):
+        try:
+            return self._store(digest, data, content_type)
+        finally:
+            with self._lock:
+                self._pending.pop(digest, None)
+
+    def _store(self, digest, data, content_type):
+        with self._lock:
+            if digest in self._done:
+                self._done.move_to_end(digest)
+                return self._done[digest]
+        bucket = self._get_bucket()
+        prefix = f"profiles/{digest}"
+
+        def put(name, payload, ctype):
+            blob = bucket.blob(f"{prefix}/{name}")
+            # same content hash -> same object: skip the upload, just link it
+            if not blob.exists():
+                blob.cache_control = CACHE_CONTROL
+                blob.upload_from_string(payload, content_type=ctype)
+                blob.make_public()
+            return blob.public_url
+
+        original = put("original", data, content_type or "application/octet-stream")
+        urls = {"profileImage": original, "profileImageThumb": original, "profileImageOriginal": original}
+        for name, payload in resize_variants(data).items():
+            url = put(f"{name}.webp", payload, "image/webp")
+            urls["profileImage" if name == "medium" else "profileImageThumb"] = url
+
+        with self._lock:
+            self._done[digest] = urls
+            while len(self._done) > self._done_cache_size:
+                self._done.popitem(last=False)  # an evicted upload is still found by blob.exists()
+        return urls
+
+    def _patch(self, future, targets, on_done):
+        try:
+            urls = future.result()
+        except Exception as e:
+            log.error("image pipeline: upload failed, keeping placeholder (%s)", e)
+            return
+        try:
+            datastore.reference().update({
+                f"{target}/{field}": url
+                for target in targets
+                for field, url in urls.items()
+            })
+            if on_done:
+                on_done(urls)
+        except Exception as e:
+            log.error("image pipeline: cannot patch %s (%s)", targets, e)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+def from_env(get_bucket):
+    return ImagePipeline(
+        get_bucket,
+        max_workers=int(os.environ.get("IMAGE_WORKERS", "2")),
+        done_cache_size=int(os.environ.get("IMAGE_DONE_CACHE_SIZE", str(DONE_CACHE_SIZE))),
+    )
@@ -0,0 +1,211 @@
+"""
+Secondary indexes kept in RTDB next to the data they index:
+
+    Indexes/UsersByUsername/<username>          -> userId
+    Indexes/TeachersByUserId/<userId>           -> teacherKey
+    Indexes/StudentsByClass/<grade><section>    -> {studentId: true}
+    Indexes/SubmissionStatus/<academicYear>/<courseId>/week_<n>/<teacherId>
+                                                -> {dayName: true}
+
+They live under their own root rather than inside Users/Teachers/Students
+because the dashboards read those trees directly and expect every child to be
+a record.
+
+Handlers write index entries in the same multi-path update as the record, so
+a lookup is a single point read.  Other services (the admin app) change
+records without touching the indexes, so an entry is only a hint: the record
+it points to is checked in the read cache, and a missing or stale entry is
+found through the cache and repaired (or removed) on the way.
+`flask backfill-indexes` rebuilds everything in one go.
+
+A class roster cannot be checked that way (a student moved out of a class
+still has a valid record), so with a read cache rosters come from the
+cached Students tree; Indexes/StudentsByClass serves processes without one.
+"""
+from urllib.parse import unquote
+
+import datastore
+
+INDEX_ROOT = "Indexes"
+BY_USERNAME = "UsersByUsername"
+TEACHER_BY_USER = "TeachersByUserId"
+STUDENTS_BY_CLASS = "StudentsByClass"
+SUBMISSION_STATUS = "SubmissionStatus"
+
+# Characters RTDB refuses in keys, plus the escape character itself.
+_KEY_ESCAPES = {c: "%{:02X}".format(ord(c)) for c in "%.$#[]/"}
+
+
+def encode_key(value):
+    """Make an arbitrary string safe to use as an RTDB key."""
+    return "".join(_KEY_ESCAPES.get(c, c) for c in str(value))
+
+
+def decode_key(key):
+    return unquote(key)
+
+
+def class_key(grade, section):
+    return encode_key(f"{grade}{section}")
+
+
+def _path(*parts):
+    return "/".join([INDEX_ROOT] + [str(p) for p in parts])
+
+
+def teacher_key_path(user_id):
+    return _path(TEACHER_BY_USER, encode_key(user_id))
+
+
+def class_roster_path(grade, section):
+    return _path(STUDENTS_BY_CLASS, class_key(grade, section))
+
+
+def submission_status_path(academic_year, course_id=None, week=None):
+    parts = [SUBMISSION_STATUS, encode_key(academic_year)]
+    if course_id:
+        parts.append(encode_key(course_id))
+        if week not in (None, ""):
+            parts.append(encode_key(f"week_{week}"))  # not bare numbers: RTDB would return an array
+    return _path(*parts)
+
+
+# ---------------- multi-path update fragments ----------------
+def user_entries(user_id, user):
+    username = (user or {}).get("username")
+    if not username:
+        return {}
+    return {_path(BY_USERNAME, encode_key(username)): user_id}
+
+
+def teacher_entries(teacher_key, teacher):
+    user_id = (teacher or {}).get("userId")
+    if not user_id:
+        return {}
+    return {_path(TEACHER_BY_USER, encode_key(user_id)): teacher_key}
+
+
+def student_entries(student_id, student):
+    student = student or {}
+    if not student.get("grade") or not student.get("section"):
+        return {}
+    return {_path(STUDENTS_BY_CLASS, class_key(student["grade"], student["section"]), student_id): True}
+
+
+def submission_entries(submission):
+    """Status entry for one LessonPlanSubmissions record (needs week and dayName)."""
+    s = submission or {}
+    if not all(s.get(f) not in (None, "") for f in ("academicYear", "courseId", "week", "teacherId", "dayName")):
+        return {}
+    path = submission_status_path(s["academicYear"], s["courseId"], s["week"])
+    return {f"{path}/{encode_key(s['teacherId'])}/{encode_key(s['dayName'])}": True}
+
+
+# ---------------- lookups ----------------
+class Indexes:
+    def __init__(self, fallback=None):
+        # fallback: a ReadCache used for entries the index does not know yet
+        self.fallback = fallback
+
+    def _repair(self, updates):
+        if updates:
+            try:
+                datastore.reference().update(updates)
+            except Exception:
+                pass
+
+    def user_id_for_username(self, username):
+        if not username:
+            return None
+        path = _path(BY_USERNAME, encode_key(username))
+        user_id = datastore.reference(path).get()
+        if self.fallback is None:
+            return user_id
+        if user_id and (self.fallback.get_child("Users", user_id) or {}).get("username") == username:
+            return user_id
+        # missing, or stale (username changed elsewhere): ask the cache, fix the entry
+        found, _ = self.fallback.find_one("Users", "username", username)
+        if found != user_id:
+            self._repair({path: found})
+        return found
+
+    def username_taken(self, username):
+        return bool(self.user_id_for_username(username))
+
+    def teacher_key_for_user(self, user_id):
+        if not user_id:
+            return None
+        path = teacher_key_path(user_id)
+        teacher_key = datastore.reference(path).get()
+        if self.fallback is None:
+            return teacher_key
+        if teacher_key and (self.fallback.get_child("Teachers", teacher_key) or {}).get("userId") == user_id:
+            return teacher_key
+        found, _ = self.fallback.find_one("Teachers", "userId", user_id)
+        if found != teacher_key:
+            self._repair({path: found})
+        return found
+
+    def student_ids_in_class(self, grade, section):
+        if self.fallback is None:
+            return list(datastore.reference(class_roster_path(grade, section)).get() or {})
+        # the cached Students tree is current (listener) and already in memory
+        return [
+            sid for sid, s in self.fallback.find("Students", "grade", grade)
+            if s.get("section") == section
+        ]
+
+
+# ---------------- backfill ----------------
+def build_all(users, teachers, students):
+    """Return {index name: full index tree} for the given raw trees."""
+    by_username, teacher_by_user, students_by_class = {}, {}, {}
+    for user_id, user in (users or {}).items():
+        if isinstance(user, dict) and user.get("username"):
+            by_username[encode_key(user["username"])] = user_id
+    for teacher_key, teacher in (teachers or {}).items():
+        if isinstance(teacher, dict) and teacher.get("userId"):
+            teacher_by_user[encode_key(teacher["userId"])] = teacher_key
+    for student_id, student in (students or {}).items():
+        if isinstance(student, dict) and student.get("grade") and student.get("section"):
+            key = class_key(student["grade"], student["section"])
+            students_by_class.setdefault(key, {})[student_id] = True
+    return {
+        BY_USERNAME: by_username,
+        TEACHER_BY_USER: teacher_by_user,
+        STUDENTS_BY_CLASS: students_by_class,
+    }
+
+
+def build_submission_status(submissions):
+    """SubmissionStatus tree for a raw LessonPlanSubmissions tree."""
+    tree = {}
+
+    def walk(node):
+        if not isinstance(node, dict):
+            return
+        if node.get("submittedAt") and node.get("teacherId"):
+            for path in submission_entries(node):
+                branch = tree
+                parts = path.split("/")[2:]  # drop Indexes/SubmissionStatus
+                for part in parts[:-1]:
+                    branch = branch.setdefault(part, {})
+                branch[parts[-1]] = True
+            return
+        for child in node.values():
+            walk(child)
+
+    walk(submissions)
+    return tree
+
+
+def backfill():
+    """Rebuild every index from Users/Teachers/Students/LessonPlanSubmissions. Returns entry counts."""
+    trees = build_all(
+        datastore.reference("Users").get(),
+        datastore.reference("Teachers").get(),
+        datastore.reference("Students").get(),
+    )
+    trees[SUBMISSION_STATUS] = build_submission_status(datastore.reference("LessonPlanSubmissions").get())
+    datastore.reference(INDEX_ROOT).update(trees)
+    return {name: len(tree) for name, tree in trees.items()}
@@ -0,0 +1,341 @@
+"""
+Per-request instrumentation of backend round trips, bytes and latency.
+
+datastore.reference() / datastore.bucket() hand out wrapped objects that
+record every RTDB read/write (count, time and, with INSTRUMENT_BYTES=1, the
+approximate JSON bytes moved) and every Storage call into the RequestStats of the current request.  The stats
+live in a context variable; pass work to other threads with
+contextvars.copy_context().run so their calls are attributed too.  Calls made
+outside a request (listeners, background uploads) are recorded under the
+route "background".
+
+install(app) adds:
+  * Server-Timing and X-Backend-Reads headers on every response
+  * one structured (JSON) log line per request on the "gojo.request" logger
+  * GET /metrics in Prometheus text format, aggregated per route
+
+INSTRUMENTATION=0 turns the wrappers off.  The payload size estimate is off
+by default: it re-serializes every value read and written, which costs more
+CPU than the request itself on large reads.  Set INSTRUMENT_BYTES=1 to
+turn it on while profiling; bytes_down / bytes_up stay 0 otherwise.
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+
+ENABLED = os.environ.get("INSTRUMENTATION", "1") != "0"
+MEASURE_BYTES = os.environ.get("INSTRUMENT_BYTES", "0") == "1"
+REQUEST_LOG = os.environ.get("REQUEST_LOG", "1") != "0"
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+request_log = logging.getLogger("gojo.request")
+
+_current = contextvars.ContextVar("request_stats", default=None)
+
+
+def payload_size(value):
+    if not MEASURE_BYTES or value is None:
+        return 0
+    try:
+        return len(json.dumps(value, separators=(",", ":"), default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+class RequestStats:
+    FIELDS = ("reads", "writes", "bytes_down", "bytes_up", "storage_calls")
+
+    def __init__(self, route="background"):
+        self.route = route
+        self.started = time.perf_counter()
+        self.reads = self.writes = self.bytes_down = self.bytes_up = self.storage_calls = 0
+        self.rtdb_seconds = 0.0
+        self.storage_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, seconds, reads=0, writes=0, bytes_down=0, bytes_up=0, storage_calls=0):
+        with self._lock:
+            self.reads += reads
+            self.writes += writes
+            self.bytes_down += bytes_down
+            self.bytes_up += bytes_up
+            self.storage_calls += storage_calls
+            if storage_calls:
+                self.storage_seconds += seconds
+            else:
+                self.rtdb_seconds += seconds
+
+
+def current():
+    return _current.get()
+
+
+# ---------------- metrics registry ----------------
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}    # (route, method, status) -> count
+        self.durations = {}   # route -> [bucket counts..., sum, count]
+        self.backend = {}     # route -> {field: total}
+        self.collectors = []  # () -> [exposition lines], from other modules
+
+    def observe(self, stats, method="", status="", seconds=None):
+        with self._lock:
+            if seconds is not None:
+                key = (stats.route, method, str(status))
+                self.requests[key] = self.requests.get(key, 0) + 1
+                hist = self.durations.setdefault(stats.route, [0] * len(DURATION_BUCKETS) + [0.0, 0])
+                for i, bound in enumerate(DURATION_BUCKETS):
+                    if seconds <= bound:
+                        hist[i] += 1
+                hist[-2] += seconds
+                hist[-1] += 1
+            totals = self.backend.setdefault(stats.route, {f: 0 for f in RequestStats.FIELDS})
+            for f in RequestStats.FIELDS:
+                totals[f] += getattr(stats, f)
+
+    def register(self, collector):
+        self.collectors.append(collector)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            lines.append("# TYPE gojo_http_requests_total counter")
+            for (route, method, status), count in sorted(self.requests.items()):
+                lines.append(f'gojo_http_requests_total{{route="{route}",method="{method}",status="{status}"}} {count}')
+            lines.append("# TYPE gojo_http_request_duration_seconds histogram")
+            for route, hist in sorted(self.durations.items()):
+                for bound, count in zip(DURATION_BUCKETS, hist):
+                    lines.append(f'gojo_http_request_duration_seconds_bucket{{route="{route}",le="{bound}"}} {count}')
+                lines.append(f'gojo_http_request_duration_seconds_bucket{{route="{route}",le="+Inf"}} {hist[-1]}')
+                lines.append(f'gojo_http_request_duration_seconds_sum{{route="{route}"}} {hist[-2]:.6f}')
+                lines.append(f'gojo_http_request_duration_seconds_count{{route="{route}"}} {hist[-1]}')
+            for field, name in (("reads", "gojo_rtdb_reads_total"), ("writes", "gojo_rtdb_writes_total"),
+                                ("bytes_down", "gojo_rtdb_bytes_downloaded_total"),
+                                ("bytes_up", "gojo_rtdb_bytes_uploaded_total"),
+                                ("storage_calls", "gojo_storage_calls_total")):
+                lines.append(f"# TYPE {name} counter")
+                for route, totals in sorted(self.backend.items()):
+                    lines.append(f'{name}{{route="{route}"}} {totals[field]}')
+        for collector in self.collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def _record(seconds, **counts):
+    stats = _current.get()
+    if stats is not None:
+        stats.add(seconds, **counts)
+    else:
+        background = RequestStats()
+        background.add(seconds, **counts)
+        metrics.observe(background)
+
+
+# ---------------- RTDB wrappers ----------------
+class InstrumentedQuery:
+    def __init__(self, query):
+        self._query = query
+
+    def _chain(self, name, *args):
+        return InstrumentedQuery(getattr(self._query, name)(*args))
+
+    def start_at(self, value):
+        return self._chain("start_at", value)
+
+    def end_at(self, value):
+        return self._chain("end_at", value)
+
+    def equal_to(self, value):
+        return self._chain("equal_to", value)
+
+    def limit_to_first(self, limit):
+        return self._chain("limit_to_first", limit)
+
+    def limit_to_last(self, limit):
+        return self._chain("limit_to_last", limit)
+
+    def get(self):
+        start = time.perf_counter()
+        value = self._query.get()
+        _record(time.perf_counter() - start, reads=1, bytes_down=payload_size(value))
+        return value
+
+
+class InstrumentedReference:
+    def __init__(self, ref):
+        self._ref = ref
+
+    @property
+    def key(self):
+        return self._ref.key
+
+    @property
+    def path(self):
+        return self._ref.path
+
+    @property
+    def parent(self):
+        parent = self._ref.parent
+        return InstrumentedReference(parent) if parent is not None else None
+
+    def child(self, path):
+        return InstrumentedReference(self._ref.child(path))
+
+    def get(self, *args, **kwargs):
+        start = time.perf_counter()
+        value = self._ref.get(*args, **kwargs)
+        body = value[0] if kwargs.get("etag") or (args and args[0]) else value
+        _record(time.perf_counter() - start, reads=1, bytes_down=payload_size(body))
+        return value
+
+    def get_if_changed(self, etag):
+        start = time.perf_counter()
+        changed, value, new_etag = self._ref.get_if_changed(etag)
+        _record(time.perf_counter() - start, reads=1, bytes_down=payload_size(value))
+        return changed, value, new_etag
+
+    def _write(self, name, value, *args):
+        start = time.perf_counter()
+        result = getattr(self._ref, name)(*args)
+        _record(time.perf_counter() - start, writes=1, bytes_up=payload_size(value))
+        return result
+
+    def set(self, value):
+        return self._write("set", value, value)
+
+    def update(self, value):
+        return self._write("update", value, value)
+
+    def delete(self):
+        return self._write("delete", None)
+
+    def push(self, value=""):
+        return InstrumentedReference(self._write("push", value, value))
+
+    def transaction(self, transaction_update):
+        start = time.perf_counter()
+        result = self._ref.transaction(transaction_update)
+        size = payload_size(result)
+        _record(time.perf_counter() - start, reads=1, writes=1, bytes_down=size, bytes_up=size)
+        return result
+
+    def listen(self, callback):
+        # long-lived stream: not attributed to a request
+        return self._ref.listen(callback)
+
+    def order_by_child(self, path):
+        return InstrumentedQuery(self._ref.order_by_child(path))
+
+    def order_by_key(self):
+        return InstrumentedQuery(self._ref.order_by_key())
+
+    def order_by_value(self):
+        return InstrumentedQuery(self._ref.order_by_value())
+
+    def __getattr__(self, name):
+        return getattr(self._ref, name)
+
+
+# ---------------- Storage wrappers ----------------
+class InstrumentedBlob:
+    COUNTED = ("exists", "upload_from_string", "upload_from_file", "make_public", "download_as_bytes", "delete")
+
+    def __init__(self, blob):
+        object.__setattr__(self, "_blob", blob)
+
+    def __getattr__(self, name):
+        attr = getattr(self._blob, name)
+        if name not in self.COUNTED:
+            return attr
+
+        def call(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                _record(time.perf_counter() - start, storage_calls=1)
+        return call
+
+    def __setattr__(self, name, value):
+        setattr(self._blob, name, value)
+
+
+class InstrumentedBucket:
+    def __init__(self, bucket):
+        self._bucket = bucket
+
+    def blob(self, name, *args, **kwargs):
+        return InstrumentedBlob(self._bucket.blob(name, *args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._bucket, name)
+
+
+def wrap_reference(ref):
+    return InstrumentedReference(ref) if ENABLED else ref
+
+
+def wrap_bucket(bucket):
+    return InstrumentedBucket(bucket) if ENABLED else bucket
+
+
+# ---------------- Flask middleware ----------------
+def install(app):
+    from flask import Response, request
+
+    @app.before_request
+    def _start_request_stats():
+        rule = request.url_rule.rule if request.url_rule else "unmatched"
+        stats = RequestStats(rule)
+        # reads the async gateway (asgi.py) made ahead of the handler
+        prefetch = request.environ.get("gojo.prefetch_stats")
+        if prefetch:
+            stats.add(**prefetch)
+        request.environ["gojo.stats_token"] = _current.set(stats)
+
+    @app.after_request
+    def _finish_request_stats(response):
+        stats = _current.get()
+        if stats is None:
+            return response
+        elapsed = time.perf_counter() - stats.started
+        metrics.observe(stats, request.method, response.status_code, elapsed)
+
+        response.headers["X-Backend-Reads"] = str(stats.reads)
+        response.headers["Server-Timing"] = ", ".join([
+            f"app;dur={elapsed * 1000:.1f}",
+            f'rtdb;dur={stats.rtdb_seconds * 1000:.1f};desc="{stats.reads} reads, {stats.writes} writes, {stats.bytes_down} B"',
+            f'storage;dur={stats.storage_seconds * 1000:.1f};desc="{stats.storage_calls} calls"',
+        ])
+        if REQUEST_LOG:
+            request_log.info(json.dumps({
+                "route": stats.route,
+                "method": request.method,
+                "status": response.status_code,
+                "ms": round(elapsed * 1000, 2),
+                "rtdbMs": round(stats.rtdb_seconds * 1000, 2),
+                "reads": stats.reads,
+                "writes": stats.writes,
+                "bytesDown": stats.bytes_down,
+                "bytesUp": stats.bytes_up,
+                "storageCalls": stats.storage_calls,
+            }))
+        return response
+
+    @app.teardown_request
+    def _reset_request_stats(exc):
+        token = request.environ.pop("gojo.stats_token", None)
+        if token is not None:
+            _current.reset(token)
+
+    @app.route("/metrics")
+    def prometheus_metrics():
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
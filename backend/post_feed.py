@@ -0,0 +1,326 @@
+"""
+Server-Sent Events feed of post activity for the teacher dashboards.
+
+One PostFeed per process keeps one RTDB listener on Posts (new / removed
+posts, likes) and one on TeacherPosts (seenBy flags), attached when the
+first client connects and closed when the last one leaves.  Each listener
+event is diffed against an in-memory mirror of the node and turned into
+small events:
+
+    post    {postId, adminId, adminName, ..., likeCount}   (get_posts item shape)
+    remove  {postId}
+    like    {postId, likeCount, likes: {teacherId: true|false}}   (changed entries)
+    seen    {postId, teacherId}     (only to that teacher's streams, or untargeted ones)
+    reset   {}                      the client missed events: refetch /api/get_posts
+
+Every event is serialized once and handed to each subscriber's queue, so an
+extra open dashboard costs a queue and no backend reads.  Events carry an
+SSE id; a reconnecting client (Last-Event-ID) gets the last FEED_REPLAY
+events replayed, or `reset` if they are gone.  A client that falls
+FEED_QUEUE_SIZE events behind is dropped with `reset`.
+
+Under gunicorn every open stream holds a worker thread, so the Flask route
+serves at most FEED_WSGI_STREAMS of them per process and answers 503 after
+that.  asgi.py serves this endpoint on the event loop with no such limit;
+it is what the Dockerfile and Procfile run.
+"""
+import asyncio
+import copy
+import json
+import logging
+import os
+import queue
+import threading
+from collections import deque
+
+import datastore
+
+log = logging.getLogger(__name__)
+
+FEED_PATH = "/api/posts/stream"
+FEED_QUEUE_SIZE = int(os.environ.get("FEED_QUEUE_SIZE", "256"))
+FEED_REPLAY = int(os.environ.get("FEED_REPLAY", "256"))
+FEED_HEARTBEAT = float(os.environ.get("FEED_HEARTBEAT", "15"))
+FEED_RETRY_MS = int(os.environ.get("FEED_RETRY_MS", "5000"))
+FEED_WSGI_STREAMS = int(os.environ.get("FEED_WSGI_STREAMS", "2"))
+
+POSTS_NODE = "Posts"
+SEEN_NODE = "TeacherPosts"
+
+# no caching, and no buffering by nginx-style proxies in front of the app
+STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+# an SSE comment line: keeps proxies from closing an idle stream
+KEEPALIVE = ": keepalive\n\n"
+
+
+def _split(path):
+    return [p for p in (path or "").split("/") if p]
+
+
+class Mirror:
+    """In-memory copy of one node, fed by its listener; reports what each event changed."""
+
+    def __init__(self):
+        self.data = {}
+
+    def apply(self, event_type, path, data):
+        """Apply a listener event; returns {childKey: (old, new)} for every child it touched."""
+        parts = _split(path)
+        if event_type == "patch":
+            writes = [(parts + _split(k), v) for k, v in (data or {}).items()]
+        else:
+            writes = [(parts, data)]
+
+        before = {}
+        for parts, value in writes:
+            if parts:
+                keys = [parts[0]]
+            else:
+                keys = list(self.data) + (list(value) if isinstance(value, dict) else [])
+            for key in keys:
+                if key not in before:
+                    before[key] = copy.deepcopy(self.data.get(key))
+            self._write(parts, value)
+        return {key: (old, self.data.get(key)) for key, old in before.items()}
+
+    def _write(self, parts, value):
+        if not parts:
+            self.data = value if isinstance(value, dict) else {}
+            return
+        node = self.data
+        for p in parts[:-1]:
+            if not isinstance(node.get(p), dict):
+                if value is None:
+                    return
+                node[p] = {}
+            node = node[p]
+        if value is None:
+            node.pop(parts[-1], None)
+        else:
+            node[parts[-1]] = value
+
+
+class Subscription:
+    def __init__(self, deliver, teacher_id=None):
+        self.deliver = deliver  # deliver(frame) -> False when the client cannot keep up
+        self.teacher_id = teacher_id
+
+    def wants(self, kind, payload):
+        if kind != "seen" or not self.teacher_id:
+            return True
+        return payload.get("teacherId") == self.teacher_id
+
+
+class PostFeed:
+    def __init__(self, describe, replay=FEED_REPLAY):
+        """describe(post_id, post) -> the item /api/get_posts returns for a post."""
+        self.describe = describe
+        self._lock = threading.RLock()
+        self._subscribers = []
+        self._registrations = []
+        self._mirrors = {}
+        self._primed = set()
+        self._backlog = deque(maxlen=replay)  # (id, kind, payload, frame)
+        self._seq = 0
+
+    # ---------------- subscribers ----------------
+    def subscribe(self, deliver, teacher_id=None, last_event_id=None):
+        subscription = Subscription(deliver, teacher_id)
+        with self._lock:
+            if not self._subscribers:
+                self._attach()
+            self._subscribers.append(subscription)
+            for frame in self._replay(subscription, last_event_id):
+                deliver(frame)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+            registrations = self._detach() if not self._subscribers else []
+        # outside the lock: closing joins a listener thread that may be waiting for it
+        for registration in registrations:
+            try:
+                registration.close()
+            except Exception:
+                pass
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def _replay(self, subscription, last_event_id):
+        try:
+            last = int(last_event_id)
+        except (TypeError, ValueError):
+            return []
+        if last >= self._seq:
+            return []
+        if not self._backlog or self._backlog[0][0] > last + 1:
+            return [self._frame(self._seq, "reset", {})]
+        return [frame for seq, kind, payload, frame in self._backlog
+                if seq > last and subscription.wants(kind, payload)]
+
+    # ---------------- listeners ----------------
+    def _attach(self):
+        # ids from before a gap (no listener) must not replay across it
+        self._seq += 1
+        self._backlog.clear()
+        for node in (POSTS_NODE, SEEN_NODE):
+            mirror = self._mirrors[node] = Mirror()
+            try:
+                self._registrations.append(datastore.reference(node).listen(
+                    lambda event, node=node, mirror=mirror: self._on_event(node, mirror, event)))
+            except Exception as e:
+                log.warning("post feed: cannot listen on %s (%s)", node, e)
+
+    def _detach(self):
+        """Forget the mirrors (late events are ignored); returns the registrations to close."""
+        registrations, self._registrations = self._registrations, []
+        self._mirrors.clear()
+        self._primed.clear()
+        return registrations
+
+    def _on_event(self, node, mirror, event):
+        try:
+            with self._lock:
+                if self._mirrors.get(node) is not mirror:
+                    return  # a closed stream
+                changes = mirror.apply(event.event_type, event.path, event.data)
+                if node not in self._primed:
+                    self._primed.add(node)  # first event of a stream: the full snapshot
+                    return
+                events = self._diff_posts(changes) if node == POSTS_NODE else self._diff_seen(changes)
+                for kind, payload in events:
+                    self._publish(kind, payload)
+        except Exception as e:
+            log.warning("post feed: bad %s event (%s)", node, e)
+
+    # ---------------- diffing ----------------
+    def _diff_posts(self, changes):
+        for post_id, (old, new) in changes.items():
+            old = old if isinstance(old, dict) else None
+            new = new if isinstance(new, dict) else None
+            if old is None and new is not None:
+                yield "post", self.describe(post_id, new)
+            elif old is not None and new is None:
+                yield "remove", {"postId": post_id}
+            elif old is not None:
+                old_likes, new_likes = old.get("likes") or {}, new.get("likes") or {}
+                likes = {t: bool(new_likes.get(t)) for t in set(old_likes) | set(new_likes)
+                         if bool(old_likes.get(t)) != bool(new_likes.get(t))}
+                if likes or old.get("likeCount", 0) != new.get("likeCount", 0):
+                    yield "like", {"postId": post_id, "likeCount": new.get("likeCount", 0), "likes": likes}
+
+    @staticmethod
+    def _diff_seen(changes):
+        for post_id, (old, new) in changes.items():
+            old_seen = (old.get("seenBy") if isinstance(old, dict) else None) or {}
+            new_seen = (new.get("seenBy") if isinstance(new, dict) else None) or {}
+            for teacher_id in new_seen:
+                if new_seen.get(teacher_id) and not old_seen.get(teacher_id):
+                    yield "seen", {"postId": post_id, "teacherId": teacher_id}
+
+    # ---------------- fan-out ----------------
+    @staticmethod
+    def _frame(seq, kind, payload):
+        data = json.dumps(payload, separators=(",", ":"), default=str)
+        return f"id: {seq}\nevent: {kind}\ndata: {data}\n\n"
+
+    def _publish(self, kind, payload):
+        self._seq += 1
+        frame = self._frame(self._seq, kind, payload)
+        self._backlog.append((self._seq, kind, payload, frame))
+        for subscription in list(self._subscribers):
+            if subscription.wants(kind, payload) and subscription.deliver(frame) is False:
+                self._subscribers.remove(subscription)  # too far behind; its stream ends with reset
+
+    # ---------------- streams ----------------
+    def stream(self, teacher_id=None, last_event_id=None, heartbeat=FEED_HEARTBEAT):
+        """Blocking generator of SSE text for a WSGI response (holds its thread)."""
+        frames = queue.Queue(maxsize=FEED_QUEUE_SIZE)
+        dropped = object()
+
+        def deliver(frame):
+            try:
+                frames.put_nowait(frame)
+                return True
+            except queue.Full:
+                _force(frames, dropped)
+                return False
+
+        subscription = self.subscribe(deliver, teacher_id, last_event_id)
+        try:
+            yield f"retry: {FEED_RETRY_MS}\n\n"
+            while True:
+                try:
+                    frame = frames.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield KEEPALIVE
+                    continue
+                if frame is dropped:
+                    yield self._frame(self._seq, "reset", {})
+                    return
+                yield frame
+        finally:
+            self.unsubscribe(subscription)
+
+    async def astream(self, teacher_id=None, last_event_id=None, heartbeat=FEED_HEARTBEAT, executor=None):
+        """
+        The same stream on the event loop (asgi.py): no thread per client.
+        subscribe / unsubscribe run on `executor` (default: the loop's), as
+        attaching a listener opens a connection and closing one joins its
+        thread.
+        """
+        loop = asyncio.get_running_loop()
+        frames = asyncio.Queue(maxsize=FEED_QUEUE_SIZE)
+        dropped = object()
+        overflowed = [False]
+
+        def put(frame):
+            # runs on the loop; once dropped is queued the stream is over
+            if overflowed[0]:
+                return
+            try:
+                frames.put_nowait(frame)
+            except asyncio.QueueFull:
+                overflowed[0] = True
+                _force(frames, dropped)
+
+        def deliver(frame):
+            loop.call_soon_threadsafe(put, frame)  # listener thread -> loop
+
+        subscribing = loop.run_in_executor(executor, self.subscribe, deliver, teacher_id, last_event_id)
+        try:
+            subscription = await asyncio.shield(subscribing)
+        except asyncio.CancelledError:
+            # the client left while the listener was attaching: leave once it has
+            subscribing.add_done_callback(
+                lambda f: f.exception() is None and loop.run_in_executor(executor, self.unsubscribe, f.result()))
+            raise
+        try:
+            yield f"retry: {FEED_RETRY_MS}\n\n"
+            while True:
+                try:
+                    frame = await asyncio.wait_for(frames.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield KEEPALIVE
+                    continue
+                if frame is dropped:
+                    yield self._frame(self._seq, "reset", {})
+                    return
+                yield frame
+        finally:
+            # not awaited: a cancelled stream must not wait for the listener to close
+            loop.run_in_executor(executor, self.unsubscribe, subscription)
+
+
+def _force(frames, item):
+    """Put `item` on a full queue, discarding the oldest frame."""
+    try:
+        frames.get_nowait()
+    except (queue.Empty, asyncio.QueueEmpty):
+        pass
+    frames.put_nowait(item)
@@ -0,0 +1,361 @@
+"""
+In-process read cache for the small, hot RTDB trees.
+
+Most endpoints only need one Users/Students/Teachers record but used to
+download the whole tree to find it.  ReadCache keeps a copy of those trees in
+memory, filled once at startup and kept current by an RTDB streaming listener
+per node.  When a listener cannot be attached (emulator, network policy, ...)
+the node falls back to a short-TTL refresh instead.
+
+READ_CACHE_PREWARM picks when the nodes are first loaded (see warm()): by
+default on a background thread, so the process serves /healthz at once.
+
+A key a node does not hold is read through to RTDB (it may have been
+written by another process moments ago) unless the node is listening: the
+listener's copy is authoritative.  Misses are remembered for
+READ_CACHE_MISS_TTL seconds so a dangling id does not cost a read per request.
+
+Values returned by the cache are shared between requests: treat them as
+read-only and copy before modifying.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import datastore
+
+log = logging.getLogger(__name__)
+
+CACHED_NODES = ("Users", "Students", "Teachers", "Courses", "TeacherAssignments", "Versions")
+
+# background prewarm retries a failed load with exponential backoff (seconds)
+PREWARM_RETRY_MIN = 1.0
+PREWARM_RETRY_MAX = 60.0
+
+MISS_CACHE_MAX = 10000
+
+
+class ReadCache:
+    def __init__(self, nodes=CACHED_NODES, ttl=30, listen=True, ready_timeout=10, miss_ttl=5):
+        self.nodes = tuple(nodes)
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self.listen = listen
+        self.ready_timeout = ready_timeout
+
+        self._lock = threading.RLock()
+        self._data = {}          # node -> dict snapshot
+        self._loaded_at = {}     # node -> monotonic time of last full load
+        self._listening = {}     # node -> ListenerRegistration
+        self._streams = {}       # node -> token of its current listener (late events of older ones are ignored)
+        self._streamed = set()   # nodes a listener has delivered a snapshot for
+        self._missing = {}       # (node, key) -> monotonic expiry of a remembered miss
+        self._indexes = {}       # (node, field) -> {value: [key, ...]}
+        self._warmed = set()     # nodes start() has loaded (listening or TTL)
+
+        self.warm_state = "cold"  # cold / warming / warm / failed / lazy
+        self.warmed_in = None
+        self.warm_error = None
+
+    # ---------------- lifecycle ----------------
+    def start(self):
+        """Load every node not loaded yet and attach listeners where possible."""
+        started = time.monotonic()
+        self.warm_state = "warming"
+        pending = [n for n in self.nodes if n not in self._warmed]
+        # all nodes at once: a cold start waits for the slowest, not the sum
+        with ThreadPoolExecutor(max_workers=len(pending) or 1, thread_name_prefix="read-cache") as pool:
+            errors = [e for e in pool.map(self._load, pending) if e is not None]
+        if errors:
+            self.warm_state = "failed"
+            self.warm_error = str(errors[0])
+            raise errors[0]
+        self.warmed_in = time.monotonic() - started
+        self.warm_error = None
+        self.warm_state = "warm"
+
+    def _load(self, node):
+        """Returns the error instead of raising, so one failed node does not stop the others."""
+        try:
+            if not (self.listen and self._attach(node)):
+                self._refresh(node)
+        except Exception as e:
+            return e
+        self._warmed.add(node)
+        return None
+
+    def warm(self, mode="background"):
+        """
+        Prewarm: "sync" loads every node now (the import waits for it),
+        "background" on a daemon thread, retrying failed nodes with backoff
+        (requests meanwhile read the nodes they need themselves), "off"
+        leaves each node to its first use, without listeners (TTL refresh).
+        """
+        if mode == "sync":
+            self.start()
+        elif mode == "background":
+            def run():
+                delay = PREWARM_RETRY_MIN
+                while True:
+                    try:
+                        self.start()
+                        return
+                    except Exception as e:
+                        log.warning("read cache: prewarm failed (%s), retrying in %.1fs", e, delay)
+                    time.sleep(delay)
+                    delay = min(delay * 2, PREWARM_RETRY_MAX)
+            threading.Thread(target=run, name="read-cache-prewarm", daemon=True).start()
+        else:
+            self.warm_state = "lazy"
+
+    def status(self):
+        """
+        For /readyz: warm state and, per node, loaded / listening.  Ready once
+        warm (or lazy), or once every node is loaded, even on demand while a
+        failed prewarm waits to retry.
+        """
+        with self._lock:
+            nodes = {n: {"loaded": n in self._data, "listening": n in self._listening} for n in self.nodes}
+        ready = self.warm_state in ("warm", "lazy") or all(n["loaded"] for n in nodes.values())
+        return {"state": self.warm_state, "ready": ready, "seconds": self.warmed_in,
+                "error": self.warm_error, "nodes": nodes}
+
+    def stop(self):
+        with self._lock:
+            registrations = list(self._listening.values())
+            self._listening.clear()
+            self._streams.clear()
+            self._streamed.clear()
+        for registration in registrations:
+            try:
+                registration.close()
+            except Exception:
+                pass
+
+    def _attach(self, node):
+        first = threading.Event()
+        stream = object()
+
+        def on_event(event):
+            self._on_event(node, stream, event)
+            first.set()
+
+        with self._lock:
+            self._streams[node] = stream
+        try:
+            registration = datastore.reference(node).listen(on_event)
+        except Exception as e:
+            log.warning("read cache: cannot listen on %s (%s), using TTL refresh", node, e)
+            self._forget_stream(node, stream)
+            return False
+
+        # The first event of a stream is a full 'put' of the node.
+        if not first.wait(self.ready_timeout) or self._streams.get(node) is not stream:
+            log.warning("read cache: no initial snapshot for %s, using TTL refresh", node)
+            self._forget_stream(node, stream)
+            _close(registration)
+            return False
+
+        with self._lock:
+            self._listening[node] = registration
+        return True
+
+    def _forget_stream(self, node, stream):
+        """Stop applying `stream`'s events; returns its registration, if it was listening."""
+        with self._lock:
+            if self._streams.get(node) is not stream:
+                return None
+            del self._streams[node]
+            self._streamed.discard(node)
+            self._loaded_at[node] = 0
+            return self._listening.pop(node, None)
+
+    # ---------------- listener events ----------------
+    def _on_event(self, node, stream, event):
+        if self._streams.get(node) is not stream:
+            return  # a listener being closed
+        try:
+            self._apply(node, event.event_type, event.path, event.data)
+            self._streamed.add(node)
+        except Exception as e:
+            # A broken stream must not leave a silently stale node behind.
+            log.warning("read cache: dropping listener on %s (%s)", node, e)
+            registration = self._forget_stream(node, stream)
+            if registration is not None:
+                # close() joins the listener thread, which is this one
+                threading.Thread(target=_close, args=(registration,), daemon=True).start()
+
+    def _apply(self, node, event_type, path, data):
+        parts = [p for p in (path or "").split("/") if p]
+        with self._lock:
+            self._forget_misses(node, parts[0] if parts else None)
+            if not parts:
+                if event_type == "put":
+                    self._data[node] = data if isinstance(data, dict) else {}
+                else:
+                    self._merge(self._data.setdefault(node, {}), data or {})
+                self._loaded_at[node] = time.monotonic()
+            else:
+                tree = self._data.setdefault(node, {})
+                for key in parts[:-1]:
+                    if not isinstance(tree.get(key), dict):
+                        tree[key] = {}
+                    tree = tree[key]
+                leaf = parts[-1]
+                if event_type == "put":
+                    if data is None:
+                        tree.pop(leaf, None)
+                    else:
+                        tree[leaf] = data
+                else:
+                    if not isinstance(tree.get(leaf), dict):
+                        tree[leaf] = {}
+                    self._merge(tree[leaf], data or {})
+            self._drop_indexes(node)
+
+    @staticmethod
+    def _merge(target, patch):
+        for key, value in patch.items():
+            if value is None:
+                target.pop(key, None)
+            else:
+                target[key] = value
+
+    # ---------------- reads ----------------
+    def _refresh(self, node):
+        # a private copy: listener events patch it in place
+        data = datastore.reference(node, coalesce=False).get() or {}
+        with self._lock:
+            if node in self._streamed:
+                # a listener attached while this read was in flight: its copy is newer
+                return self._data[node]
+            self._data[node] = data if isinstance(data, dict) else {}
+            self._loaded_at[node] = time.monotonic()
+            self._forget_misses(node)
+            self._drop_indexes(node)
+        return self._data[node]
+
+    def get(self, node):
+        """Return the whole cached node (a dict, possibly empty)."""
+        if node not in self.nodes:
+            return datastore.reference(node).get() or {}
+        with self._lock:
+            data = self._data.get(node)
+            fresh = node in self._listening or (
+                time.monotonic() - self._loaded_at.get(node, 0) < self.ttl
+            )
+        if data is None or not fresh:
+            data = self._refresh(node)
+        return data
+
+    def get_child(self, node, key):
+        """
+        Return one record of a cached node, or None.  A key the cache does not
+        know yet (written by another process moments ago) is read through,
+        unless the node is listening or the key missed recently.
+        """
+        if not key:
+            return None
+        value = self.get(node).get(key)
+        if value is not None or node not in self.nodes:
+            return value
+        now = time.monotonic()
+        with self._lock:
+            if node in self._listening or self._missing.get((node, key), 0) > now:
+                return None
+        value = datastore.reference(node, coalesce=False).child(key).get()
+        if value is not None:
+            self.put(node, key, value)
+        else:
+            with self._lock:
+                if len(self._missing) >= MISS_CACHE_MAX:
+                    self._missing = {k: t for k, t in self._missing.items() if t > now}
+                if len(self._missing) < MISS_CACHE_MAX:
+                    self._missing[(node, key)] = now + self.miss_ttl
+        return value
+
+    def _forget_misses(self, node, key=None):
+        if key is not None:
+            self._missing.pop((node, key), None)
+        else:
+            for k in [k for k in self._missing if k[0] == node]:
+                del self._missing[k]
+
+    def find(self, node, field, value):
+        """Return [(key, record), ...] whose record[field] == value."""
+        self.get(node)
+        with self._lock:
+            data = self._data.get(node, {})
+            index = self._indexes.get((node, field))
+            if index is None:
+                index = {}
+                for key, record in data.items():
+                    if isinstance(record, dict) and field in record:
+                        index.setdefault(record[field], []).append(key)
+                self._indexes[(node, field)] = index
+            return [(k, data[k]) for k in index.get(value, ()) if k in data]
+
+    def find_one(self, node, field, value):
+        """Return the first (key, record) matching field == value, or (None, None)."""
+        matches = self.find(node, field, value)
+        return matches[0] if matches else (None, None)
+
+    # ---------------- write-through ----------------
+    def put(self, node, key, value):
+        """
+        Record a write this process just made so the next request sees it
+        without waiting for the listener (or the TTL) to catch up.
+        """
+        if node not in self.nodes:
+            return
+        with self._lock:
+            self._forget_misses(node, key)
+            tree = self._data.get(node)
+            if tree is None:
+                return
+            if value is None:
+                tree.pop(key, None)
+            else:
+                tree[key] = value
+            self._drop_indexes(node)
+
+    def apply_update(self, updates):
+        """Write-through for a root multi-path update ({"Node/key/...": value})."""
+        for path, value in updates.items():
+            node, _, rest = path.strip("/").partition("/")
+            with self._lock:
+                loaded = node in self._data
+            if node in self.nodes and rest and loaded:
+                self._apply(node, "put", rest, value)
+
+    def invalidate(self, node=None):
+        with self._lock:
+            for n in ([node] if node else self.nodes):
+                self._forget_misses(n)
+                if n not in self._listening:
+                    self._loaded_at[n] = 0
+
+    def _drop_indexes(self, node):
+        for index_key in [k for k in self._indexes if k[0] == node]:
+            del self._indexes[index_key]
+
+
+def from_env():
+    """Build a ReadCache configured from READ_CACHE_* environment variables."""
+    return ReadCache(
+        ttl=float(os.environ.get("READ_CACHE_TTL", "30")),
+        listen=os.environ.get("READ_CACHE_LISTEN", "1") != "0",
+        miss_ttl=float(os.environ.get("READ_CACHE_MISS_TTL", "5")),
+    )
+
+
+def _close(registration):
+    try:
+        registration.close()
+    except Exception:
+        pass
+
+
+READ_CACHE_PREWARM = os.environ.get("READ_CACHE_PREWARM", "background")
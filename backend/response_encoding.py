@@ -0,0 +1,113 @@
+"""
+Faster JSON encoding and gzip / brotli compression of responses.
+
+install(app) sets up two things:
+
+  * an orjson-backed JSON provider for jsonify() / request.get_json(), when
+    orjson is installed.  Output matches Flask's default provider (sorted keys,
+    compact, HTTP dates for datetimes); values orjson cannot encode (integers
+    beyond 64 bits, ...) fall back to the standard encoder.
+  * an after_request hook that compresses JSON / text / JS / CSS bodies of at
+    least COMPRESS_MIN_SIZE bytes with brotli (when the Brotli package is
+    installed and the client accepts br) or gzip.
+
+COMPRESSION=0 turns compression off; COMPRESS_LEVEL (gzip, 1-9) and
+BROTLI_QUALITY (0-11) trade CPU for size.
+"""
+import gzip
+import os
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+    ORJSON_OPTIONS = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+                      | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS)
+except ImportError:  # optional: Flask's json module is used instead
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+COMPRESSION = os.environ.get("COMPRESSION", "1") != "0"
+COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", "1024"))
+COMPRESS_LEVEL = int(os.environ.get("COMPRESS_LEVEL", "6"))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", "5"))
+
+COMPRESSIBLE = ("application/json", "application/javascript", "text/")
+
+
+# ---------------- JSON ----------------
+class OrjsonProvider(DefaultJSONProvider):
+    def _encode(self, obj):
+        try:
+            return orjson.dumps(obj, default=self.default, option=ORJSON_OPTIONS)
+        except TypeError:
+            return super().dumps(obj, separators=(",", ":")).encode("utf-8")
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self._encode(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)  # indented output
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._encode(obj) + b"\n", mimetype=self.mimetype)
+
+
+# ---------------- compression ----------------
+def choose_encoding(accept_encodings):
+    if brotli is not None and accept_encodings.quality("br") > 0:
+        return "br"
+    if accept_encodings.quality("gzip") > 0:
+        return "gzip"
+    return None
+
+
+def compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=COMPRESS_LEVEL)
+
+
+def _compressible(response):
+    mimetype = response.mimetype or ""
+    return (
+        mimetype.startswith(COMPRESSIBLE)
+        and mimetype != "text/event-stream"
+        and not response.direct_passthrough
+        and not response.is_streamed
+    )
+
+
+def install(app):
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
+
+    if not COMPRESSION:
+        return
+
+    from flask import request
+
+    @app.after_request
+    def _compress_response(response):
+        if not _compressible(response):
+            return response
+        response.vary.add("Accept-Encoding")
+        if response.status_code != 200 or "Content-Encoding" in response.headers:
+            return response
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None or response.calculate_content_length() < COMPRESS_MIN_SIZE:
+            return response
+        response.set_data(compress(response.get_data(), encoding))
+        response.headers["Content-Encoding"] = encoding
+        return response
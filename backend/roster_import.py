@@ -0,0 +1,208 @@
+"""
+Bulk roster import for term start.
+
+Rows come from a streamed CSV (header row) or NDJSON upload and are handled
+in batches: each batch is validated, gets one block of GES_/GET_ IDs from the
+counter and is written as a single multi-path update (Users + Students, or
+Users + Teachers + Courses + TeacherAssignments, plus index entries).
+
+Student columns: name, password, grade, section [, username, email, phone, dob, gender]
+Teacher columns: name, password [, username, email, phone, gender, courses]
+    courses: NDJSON -> [{"subject": .., "grade": .., "section": ..}, ...]
+             CSV    -> "Math:9:A;Physics:10:B"
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+import datastore
+import indexes
+
+STUDENT_FIELDS = ("name", "password", "grade", "section", "username", "email", "phone", "dob", "gender")
+TEACHER_FIELDS = ("name", "password", "username", "email", "phone", "gender")
+REQUIRED = {"students": ("name", "password", "grade", "section"), "teachers": ("name", "password")}
+INVALID_KEY_CHARS = set(".$#[]/")
+
+def course_id_for(subject, grade, section):
+    return f"course_{subject.lower()}_{grade}{section.upper()}"
+
+
+# ---------------- parsing ----------------
+def iter_rows(stream, fmt):
+    """Yield (row number, dict or None, parse error or None) from a binary stream."""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for number, row in enumerate(reader, start=1):
+            yield number, {k.strip(): (v or "").strip() for k, v in row.items() if k}, None
+        return
+    for number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield number, None, "Row must be a JSON object"
+            continue
+        yield number, row, None
+
+
+def parse_courses(value):
+    """Return a list of {subject, grade, section} from NDJSON or CSV notation."""
+    if not value:
+        return []
+    if isinstance(value, list):
+        return [c for c in value if isinstance(c, dict)]
+    courses = []
+    for part in str(value).split(";"):
+        bits = [b.strip() for b in part.split(":")]
+        if len(bits) == 3 and all(bits):
+            courses.append({"subject": bits[0], "grade": bits[1], "section": bits[2]})
+        elif part.strip():
+            courses.append({"invalid": part.strip()})
+    return courses
+
+
+# ---------------- import ----------------
+class RosterImporter:
+    def __init__(self, cache, student_ids, teacher_ids, batch_size=500, passwords=None):
+        self.cache = cache
+        self.passwords = passwords  # auth.PasswordHasher: teacher passwords are stored hashed
+        self.allocators = {"students": student_ids, "teachers": teacher_ids}
+        self.batch_size = batch_size
+
+    def run(self, kind, rows, dry_run=False):
+        report = {"kind": kind, "dryRun": dry_run, "created": 0, "valid": 0, "invalid": 0, "rows": []}
+        seen_usernames = set()
+        seen_courses = set()
+        batch = []
+
+        for number, row, error in rows:
+            errors = [error] if error else self.validate(kind, row, seen_usernames, seen_courses)
+            if errors:
+                report["invalid"] += 1
+                report["rows"].append({"row": number, "status": "invalid", "errors": errors})
+                continue
+            report["valid"] += 1
+            batch.append((number, row))
+            if len(batch) >= self.batch_size:
+                self._flush(kind, batch, dry_run, report)
+                batch = []
+        if batch:
+            self._flush(kind, batch, dry_run, report)
+
+        report["rows"].sort(key=lambda r: r["row"])
+        return report
+
+    def validate(self, kind, row, seen_usernames, seen_courses):
+        errors = [f"{f} is required" for f in REQUIRED[kind] if not str(row.get(f) or "").strip()]
+
+        username = str(row.get("username") or "").strip()
+        if username:
+            if username in seen_usernames or self.cache.find("Users", "username", username):
+                errors.append("Username already exists")
+            seen_usernames.add(username)
+
+        if kind == "students":
+            for f in ("grade", "section"):
+                if INVALID_KEY_CHARS & set(str(row.get(f) or "")):
+                    errors.append(f"{f} contains invalid characters")
+        else:
+            courses = parse_courses(row.get("courses"))
+            row["courses"] = courses
+            for course in courses:
+                if course.get("invalid") or not all(course.get(k) for k in ("subject", "grade", "section")):
+                    errors.append(f"Invalid course {course.get('invalid') or course}")
+                    continue
+                course_id = course_id_for(course["subject"], course["grade"], course["section"])
+                if INVALID_KEY_CHARS & set(course_id):
+                    errors.append(f"Invalid course {course_id}")
+                elif course_id in seen_courses or self.cache.find("TeacherAssignments", "courseId", course_id):
+                    errors.append(f"{course['subject']} already assigned in Grade {course['grade']}{course['section']}")
+                seen_courses.add(course_id)
+        return errors
+
+    def _flush(self, kind, batch, dry_run, report):
+        if dry_run:
+            for number, row in batch:
+                report["rows"].append({"row": number, "status": "valid"})
+            return
+
+        if kind == "teachers" and self.passwords is not None:
+            hashed = self.passwords.hash_many(str(row.get("password")) for _, row in batch)
+            for (_, row), password in zip(batch, hashed):
+                row["password"] = password
+
+        ids = self.allocators[kind].allocate_block(len(batch))
+        updates, results = {}, []
+        for (number, row), new_id in zip(batch, ids):
+            user_id = datastore.push_key()
+            build = self._student if kind == "students" else self._teacher
+            updates.update(build(row, user_id, new_id))
+            results.append({
+                "row": number,
+                "status": "created",
+                "studentId" if kind == "students" else "teacherKey": new_id,
+                "username": row.get("username") or new_id,
+                "userId": user_id,
+            })
+
+        datastore.reference().update(updates)
+        self.cache.apply_update(updates)
+        report["created"] += len(results)
+        report["rows"].extend(results)
+
+    def _user(self, row, user_id, new_id, role, id_field, fields):
+        user = {f: str(row.get(f) or "").strip() for f in fields if f not in ("password", "username")}
+        user.update({
+            "userId": user_id,
+            "username": str(row.get("username") or "").strip() or new_id,
+            "password": str(row.get("password")),
+            "profileImage": "/default-profile.png",
+            "role": role,
+            "isActive": True,
+            id_field: new_id,
+        })
+        return user
+
+    def _student(self, row, user_id, student_id):
+        user = self._user(row, user_id, student_id, "student", "studentId", STUDENT_FIELDS)
+        year = datetime.utcnow().year
+        student = {
+            "userId": user_id,
+            "studentId": student_id,
+            "academicYear": f"{year-1}_{year}",
+            "dob": user.get("dob", ""),
+            "grade": user.pop("grade"),
+            "section": user.pop("section"),
+            "status": "active",
+        }
+        updates = {f"Users/{user_id}": user, f"Students/{student_id}": student}
+        updates.update(indexes.user_entries(user_id, user))
+        updates.update(indexes.student_entries(student_id, student))
+        return updates
+
+    def _teacher(self, row, user_id, teacher_id):
+        user = self._user(row, user_id, teacher_id, "teacher", "teacherId", TEACHER_FIELDS)
+        teacher = {"userId": user_id, "teacherId": teacher_id, "status": "active"}
+        updates = {f"Users/{user_id}": user, f"Teachers/{teacher_id}": teacher}
+        updates.update(indexes.user_entries(user_id, user))
+        updates.update(indexes.teacher_entries(teacher_id, teacher))
+
+        for course in row.get("courses") or []:
+            course_id = course_id_for(course["subject"], course["grade"], course["section"])
+            if not self.cache.get("Courses").get(course_id):
+                course_data = {
+                    "name": course["subject"],
+                    "subject": course["subject"],
+                    "grade": course["grade"],
+                    "section": course["section"],
+                }
+                updates[f"Courses/{course_id}"] = course_data
+            assignment_key = datastore.push_key()
+            updates[f"TeacherAssignments/{assignment_key}"] = {"teacherId": teacher_id, "courseId": course_id}
+        return updates
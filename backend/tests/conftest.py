@@ -0,0 +1,44 @@
+"""
+Tests run against the in-memory local datastore: no Firebase project or
+credentials are needed.
+
+    cd backend
+    python -m pytest -q
+
+app.py is imported once per session (it builds its read cache and feeds at
+import), so tests that go through the Flask client share one store and use
+their own keys.  Tests of a single module get a fresh store from `store`.
+"""
+import os
+import sys
+
+os.environ["DATASTORE"] = "local"
+os.environ.setdefault("PASSWORD_HASH_WORKERS", "0")  # hash inline: no pool processes
+os.environ.setdefault("READ_CACHE_PREWARM", "sync")
+os.environ.setdefault("REQUEST_LOG", "0")
+os.environ.setdefault("SESSION_SECRET", "test-secret")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+import datastore  # noqa: E402
+
+
+@pytest.fixture
+def store():
+    """A fresh local store for the test; the session's store is put back after it."""
+    previous = datastore.local_store()
+    yield datastore.use_local()
+    datastore.use_local(previous)
+
+
+@pytest.fixture(scope="session")
+def app_module():
+    import app
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
@@ -0,0 +1,92 @@
+"""Conditional GETs: ETag / 304 for token, record and RTDB-ETag versioned endpoints."""
+import pytest
+
+import datastore
+
+
+@pytest.fixture
+def teacher(app_module):
+    datastore.reference().update({
+        "Courses/c_etag_1": {"subject": "Math", "grade": "9", "section": "A"},
+        "TeacherAssignments/a_etag_1": {"teacherId": "T_ETAG", "courseId": "c_etag_1"},
+        "ClassMarks/c_etag_1/s1": {"mark20": 10, "mark30": 20, "mark50": 30},
+    })
+    return "T_ETAG"
+
+
+def revalidate(client, url, etag):
+    return client.get(url, headers={"If-None-Match": etag})
+
+
+def test_unchanged_response_is_answered_with_304(client, teacher):
+    url = f"/api/teacher/{teacher}/courses"
+    response = client.get(url)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+    not_modified = revalidate(client, url, etag)
+    assert not_modified.status_code == 304
+    assert not_modified.get_data() == b""
+    assert not_modified.headers["ETag"] == etag
+
+
+def test_course_edit_from_another_service_changes_the_etag(client, teacher):
+    url = f"/api/teacher/{teacher}/courses"
+    etag = client.get(url).headers["ETag"]
+
+    # written straight to RTDB, as the admin app does: no version token bump
+    datastore.reference("Courses/c_etag_1/section").set("B")
+    response = revalidate(client, url, etag)
+    assert response.status_code == 200
+    assert response.get_json()["courses"][0]["section"] == "B"
+
+    datastore.reference("TeacherAssignments/a_etag_2").set({"teacherId": teacher, "courseId": "c_etag_1"})
+    assert revalidate(client, url, response.headers["ETag"]).status_code == 200
+
+
+def test_etag_differs_per_query(client, teacher):
+    first = client.get("/api/course/c_etag_1/stats").headers["ETag"]
+    other = client.get("/api/course/c_etag_1/stats?bins=5").headers["ETag"]
+    assert first != other
+    assert revalidate(client, "/api/course/c_etag_1/stats?bins=5", first).status_code == 200
+
+
+def test_stats_follow_marks_written_elsewhere(client, teacher):
+    url = "/api/course/c_etag_1/stats"
+    response = client.get(url)
+    etag = response.headers["ETag"]
+    assert revalidate(client, url, etag).status_code == 304
+
+    datastore.reference("ClassMarks/c_etag_1/s2").set({"mark20": 1, "mark30": 2, "mark50": 3})
+    response = revalidate(client, url, etag)
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert revalidate(client, url, response.headers["ETag"]).status_code == 304
+
+
+def test_version_token_answers_304_and_moves_on_write(client, app_module):
+    teacher_id = "T_ETAG_PLANS"
+    url = f"/api/lesson-plans/{teacher_id}"
+    app_module.versions.bump("lessonPlans", teacher_id)
+    response = client.get(url)
+    etag = response.headers["ETag"]
+    assert "Last-Modified" in response.headers
+    assert revalidate(client, url, etag).status_code == 304
+
+    saved = client.post("/api/lesson-plans/patch", json={
+        "teacherId": teacher_id, "courseId": "c1", "week": 1, "days": {"0": {"topic": "x"}},
+    })
+    assert saved.status_code == 200
+    assert revalidate(client, url, etag).status_code == 200
+
+
+def test_body_hash_etag_without_a_version(client, app_module):
+    datastore.reference("Posts").set({"p_etag": {"adminId": "a1", "message": "m", "time": "2025-01-01"}})
+    try:
+        etag = client.get("/api/get_posts").headers["ETag"]
+        assert revalidate(client, "/api/get_posts", etag).status_code == 304
+        datastore.reference("Posts/p_etag/message").set("edited")
+        assert revalidate(client, "/api/get_posts", etag).status_code == 200
+    finally:
+        datastore.reference("Posts").delete()
@@ -0,0 +1,90 @@
+"""GES_/GET_ ID allocation: counter blocks, the existence probe and re-sync."""
+import pytest
+
+import id_allocator
+from id_allocator import IdAllocator, format_id, parse_seq
+
+
+def students(block_size=1):
+    return IdAllocator("GES", "counters/students", "Students", "studentId", block_size,
+                       legacy_paths=("Users_counters/students",))
+
+
+def ids(*seqs):
+    return [format_id("GES", seq) for seq in seqs]
+
+
+def records(*student_ids):
+    """Students records (an empty one would not be stored at all)."""
+    return {student_id: {"studentId": student_id} for student_id in student_ids}
+
+
+def test_format_and_parse_round_trip():
+    assert format_id("GES", 12, "26") == "GES_0012_26"
+    assert parse_seq("GES_0012_26", "GES") == 12
+    assert parse_seq("GES_12345_26", "GES") == 12345
+    assert parse_seq("GET_0012_26", "GES") is None
+
+
+def test_block_is_consecutive_and_moves_the_counter(store):
+    allocator = students()
+    assert allocator.allocate_block(3) == ids(1, 2, 3)
+    assert allocator.allocate_block(2) == ids(4, 5)
+    assert store.reference("counters/students").get() == 5
+    assert allocator.allocate_block(0) == []
+
+
+def test_local_blocks_hand_out_ids_without_a_transaction_each(store):
+    allocator = students(block_size=10)
+    assert [allocator.next_seq() for _ in range(3)] == [1, 2, 3]
+    assert store.reference("counters/students").get() == 10
+
+
+def test_taken_block_resyncs_the_counter_and_reallocates(store):
+    store.reference("Students").set(records(*ids(2, 7)))
+    store.reference("counters/students").set(1)  # lagging behind the stored IDs
+
+    assert students().allocate_block(3) == ids(8, 9, 10)
+    assert store.reference("counters/students").get() == 10
+
+
+def test_resync_honours_the_legacy_counter(store):
+    store.reference("Students").set(records(*ids(1)))
+    store.reference("Users_counters/students").set(40)
+
+    assert students().allocate_block(2) == ids(41, 42)
+
+
+def test_probe_handles_ids_crossing_a_width(store):
+    store.reference("Students").set(records(*ids(10000)))
+    store.reference("counters/students").set(9998)
+
+    # 9999..10001 holds the stored GES_10000: that block is skipped
+    assert students().allocate_block(3) == ids(10002, 10003, 10004)
+
+
+def test_ids_of_other_years_in_the_range_are_not_collisions(store):
+    store.reference("Students").set(records(format_id("GES", 2, "20")))
+
+    assert students().allocate_block(3) == ids(1, 2, 3)
+
+
+def test_block_still_taken_after_resync_fails_the_import(store, monkeypatch):
+    allocator = students()
+    monkeypatch.setattr(allocator, "taken", lambda block: {block[0]})
+    with pytest.raises(RuntimeError, match="sync-id-counters"):
+        allocator.allocate_block(2)
+
+
+def test_single_allocation_skips_taken_ids(store):
+    store.reference("Students").set(records(*ids(1)))
+    allocator = students()
+    assert allocator.allocate() == ids(2)[0]
+    assert allocator.allocate(taken=lambda candidate: candidate == ids(3)[0]) == ids(4)[0]
+
+
+def test_from_env_reads_the_block_size(monkeypatch):
+    monkeypatch.setenv("ID_BLOCK_SIZE", "25")
+    student_ids, teacher_ids = id_allocator.from_env()
+    assert (student_ids.block_size, teacher_ids.block_size) == (25, 25)
+    assert student_ids.legacy_paths == ("Users_counters/students",)
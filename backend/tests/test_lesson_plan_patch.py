@@ -0,0 +1,65 @@
+"""POST /api/lesson-plans/patch: merged autosaves and the 409 on a stale base."""
+import datastore
+
+URL = "/api/lesson-plans/patch"
+
+
+def plan(teacher_id, name="week_1"):
+    return datastore.reference(f"LessonPlans/{teacher_id}/default/courses/c1/{name}").get()
+
+
+def entries(value):
+    """Index -> entry, whichever shape RTDB exported (dense keys come back as a list)."""
+    if isinstance(value, list):
+        value = dict(enumerate(value))
+    return {str(k): v for k, v in value.items() if v is not None}
+
+
+def patch(client, teacher_id, base=None, **body):
+    body.setdefault("week", 1)
+    return client.post(URL, json={"teacherId": teacher_id, "courseId": "c1", "baseUpdatedAt": base, **body})
+
+
+def test_patches_from_the_current_copy_are_merged(client, app_module):
+    created = patch(client, "T_PATCH_1", days={"0": {"topic": "a"}, "1": {"topic": "b"}}, weekTopic="w")
+    assert created.status_code == 200
+    base = created.get_json()["updatedAt"]
+
+    saved = patch(client, "T_PATCH_1", base, days={"1": None, "2": {"topic": "c"}})
+    assert saved.status_code == 200
+    stored = plan("T_PATCH_1")
+    assert entries(stored["days"]) == {"0": {"topic": "a"}, "2": {"topic": "c"}}
+    assert stored["weekTopic"] == "w"
+    assert stored["updatedAt"] == saved.get_json()["updatedAt"] != base
+
+
+def test_stale_base_is_rejected_and_nothing_written(client, app_module):
+    base = patch(client, "T_PATCH_2", days={"0": {"topic": "a"}}).get_json()["updatedAt"]
+    current = patch(client, "T_PATCH_2", base, days={"0": {"topic": "tab 1"}}).get_json()["updatedAt"]
+
+    stale = patch(client, "T_PATCH_2", base, days={"0": {"topic": "tab 2"}, "1": {"topic": "x"}})
+    assert stale.status_code == 409
+    assert stale.get_json()["updatedAt"] == current
+    assert entries(plan("T_PATCH_2")["days"]) == {"0": {"topic": "tab 1"}}
+
+
+def test_first_save_needs_no_base_but_a_second_one_does(client, app_module):
+    assert patch(client, "T_PATCH_3", days={"0": {"topic": "a"}}).status_code == 200
+    assert patch(client, "T_PATCH_3", days={"0": {"topic": "b"}}).status_code == 409
+
+
+def test_annual_rows_stored_as_a_list_are_merged(client, app_module):
+    datastore.reference("LessonPlans/T_PATCH_4/default/courses/c1/annual").set(
+        {"annualRows": [{"unit": "1"}, {"unit": "2"}], "updatedAt": "v1"})
+
+    saved = patch(client, "T_PATCH_4", "v1", week=None, annualRows={"0": None, "2": {"unit": "3"}})
+    assert saved.status_code == 200
+    assert entries(plan("T_PATCH_4", "annual")["annualRows"]) == {"1": {"unit": "2"}, "2": {"unit": "3"}}
+
+
+def test_invalid_entries_are_rejected(client, app_module):
+    assert patch(client, "T_PATCH_5", days={"x": {"topic": "a"}}).status_code == 400
+    assert patch(client, "T_PATCH_5", days={"0": "a"}).status_code == 400
+    assert patch(client, "T_PATCH_5", days=[{"topic": "a"}]).status_code == 400
+    assert patch(client, "T_PATCH_5", days={}).status_code == 400
+    assert plan("T_PATCH_5") is None
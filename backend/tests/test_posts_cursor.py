@@ -0,0 +1,60 @@
+"""Cursor pagination of /api/get_posts: newest first by (time, postId), ties included."""
+import pytest
+
+import datastore
+
+POSTS = {
+    "p1": {"adminId": "a1", "message": "1", "time": "2025-01-01T08:00:00"},
+    "p2": {"adminId": "a1", "message": "2", "time": "2025-01-02T08:00:00"},
+    "p3": {"adminId": "a1", "message": "3", "time": "2025-01-02T08:00:00"},
+    "p4": {"adminId": "a1", "message": "4", "time": "2025-01-02T08:00:00"},
+    "p5": {"adminId": "a1", "message": "5", "time": "2025-01-03T08:00:00"},
+}
+NEWEST_FIRST = ["p5", "p4", "p3", "p2", "p1"]
+
+
+@pytest.fixture
+def posts(app_module):
+    datastore.reference("Posts").set(POSTS)
+    yield
+    datastore.reference("Posts").delete()
+
+
+def pages(client, limit):
+    """Every page of /api/get_posts?limit=, following X-Next-Before."""
+    result, before = [], None
+    while True:
+        query = {"limit": limit, **({"before": before} if before else {})}
+        response = client.get("/api/get_posts", query_string=query)
+        assert response.status_code == 200
+        result.append([item["postId"] for item in response.get_json()])
+        before = response.headers.get("X-Next-Before")
+        if not before:
+            return result
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 4, 5, 10])
+def test_pages_cover_every_post_once_in_order(client, posts, limit):
+    result = pages(client, limit)
+    assert [post_id for page in result for post_id in page] == NEWEST_FIRST
+    assert all(len(page) <= limit for page in result)
+
+
+def test_cursor_inside_a_tie_continues_with_the_rest_of_it(client, posts):
+    response = client.get("/api/get_posts", query_string={"limit": 2})
+    assert [item["postId"] for item in response.get_json()] == ["p5", "p4"]
+    assert response.headers["X-Next-Before"] == "2025-01-02T08:00:00|p4"
+
+    response = client.get("/api/get_posts", query_string={"limit": 2, "before": "2025-01-02T08:00:00|p4"})
+    assert [item["postId"] for item in response.get_json()] == ["p3", "p2"]
+
+
+def test_bare_time_cursor_skips_every_post_at_that_time(client, posts):
+    response = client.get("/api/get_posts", query_string={"limit": 10, "before": "2025-01-02T08:00:00"})
+    assert [item["postId"] for item in response.get_json()] == ["p1"]
+    assert "X-Next-Before" not in response.headers
+
+
+def test_cursor_header_is_readable_cross_origin(client, posts):
+    response = client.get("/api/get_posts", query_string={"limit": 1}, headers={"Origin": "http://dashboard"})
+    assert "X-Next-Before" in response.headers.get("Access-Control-Expose-Headers", "")
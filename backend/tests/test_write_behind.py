@@ -0,0 +1,86 @@
+"""WriteBehind flushes: merging, splitting rejected batches, requeue and drop."""
+import pytest
+
+import datastore
+from write_behind import WriteBehind
+
+SEEN = "TeacherPosts/p1/seenBy"
+
+
+def buffer(**kwargs):
+    """Writes stay queued until the test calls flush(): no background thread."""
+    writes = WriteBehind(interval=60, **kwargs)
+    writes._stopping.set()
+    return writes
+
+
+@pytest.fixture
+def failing_updates(monkeypatch):
+    """Make the next `n` root updates fail with a network-style error."""
+    original = datastore.LocalReference.update
+    remaining = [0]
+
+    def update(ref, value):
+        if remaining[0] > 0:
+            remaining[0] -= 1
+            raise ConnectionError("backend unreachable")
+        return original(ref, value)
+
+    monkeypatch.setattr(datastore.LocalReference, "update", update)
+    return remaining
+
+
+def test_queued_writes_merge_into_one_flush(store):
+    writes = buffer()
+    writes.set(f"{SEEN}/t1", True)
+    writes.set(f"{SEEN}/t1", True)
+    writes.set(f"{SEEN}/t2", True)
+    assert writes.get(f"{SEEN}/t1") is True
+
+    assert writes.flush() == 2
+    assert store.reference(SEEN).get() == {"t1": True, "t2": True}
+    assert writes.counters["queued"] == 2 and writes.counters["merged"] == 1
+    assert writes.flushes == {"ok": 1, "failed": 0}
+
+
+def test_rejected_paths_are_isolated_and_the_rest_written(store):
+    writes = buffer()
+    for teacher_id in ("t1", "t2", "bad.id", "t3", "t4"):
+        writes.set(f"{SEEN}/{teacher_id}", True)
+
+    assert writes.flush() == 4
+    assert store.reference(SEEN).get() == {"t1": True, "t2": True, "t3": True, "t4": True}
+    assert writes.counters["rejected"] == 1
+    assert writes.size == 0
+
+
+def test_transient_failure_requeues_under_newer_writes(store, failing_updates):
+    writes = buffer()
+    writes.set(f"{SEEN}/t1", True)
+    failing_updates[0] = 1
+
+    assert writes.flush() == 0
+    assert writes.flushes["failed"] == 1
+    assert writes.get(f"{SEEN}/t1") is True
+
+    writes.set(f"{SEEN}/t1", False)  # newer than the failed batch: it wins
+    assert writes.flush() == 1
+    assert store.reference(f"{SEEN}/t1").get() is False
+
+
+def test_failed_batch_is_dropped_when_the_queue_is_full(store, monkeypatch):
+    writes = buffer(max_pending=3)
+    writes.set(f"{SEEN}/t1", True)
+    writes.set(f"{SEEN}/t2", True)
+
+    def update(ref, value):
+        # callers keep queueing while the flush is failing
+        writes.set(f"{SEEN}/t3", True)
+        writes.set(f"{SEEN}/t4", True)
+        raise ConnectionError("backend unreachable")
+
+    monkeypatch.setattr(datastore.LocalReference, "update", update)
+    assert writes.flush() == 0
+    assert writes.counters["dropped"] == 2
+    assert writes.get(f"{SEEN}/t1") is None
+    assert writes.get(f"{SEEN}/t3") is True
@@ -0,0 +1,171 @@
+"""
+Write-behind buffer for small, frequent, low-value writes: the teachers'
+post seen flags.
+
+mark_teacher_post_seen used to write its flag on the request thread.  Now it
+queues the write here and returns.  A background thread flushes everything
+queued during the last WRITE_BEHIND_MS as ONE root multi-path update():
+
+    TeacherPosts/<postId>/seenBy/<teacherId>   true     (last write wins)
+
+so a class opening the same post costs one write.  Only idempotent
+last-write-wins values belong here: likes stay on transactions in
+like_post, because a toggle decided from a stale read cannot be merged
+safely across processes.
+
+RTDB rejects a whole multi-path update if one key is invalid.  When a flush
+is refused that way the batch is split in halves until the offending paths
+are isolated; those are dropped (counted as rejected) and the rest is
+written.  Any other failure (network, outage) puts the batch back under
+newer writes for the next tick, or drops it (counted) if that would overflow
+WRITE_BEHIND_MAX_PENDING.  The same bound applies to callers: once reached,
+the caller flushes inline instead of queueing more.
+
+stop() flushes what is left; it runs at exit and on the ASGI lifespan
+shutdown.  WRITE_BEHIND_MS=0 turns the buffer off: every write is flushed by
+its caller.  Other readers see a write only after its flush; get() answers
+from the queue (including a flush in flight).  Counters are exported on
+/metrics as gojo_write_behind_*.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+
+import datastore
+
+log = logging.getLogger(__name__)
+
+WRITE_BEHIND_MS = float(os.environ.get("WRITE_BEHIND_MS", "250"))
+WRITE_BEHIND_MAX_PENDING = int(os.environ.get("WRITE_BEHIND_MAX_PENDING", "10000"))
+
+
+class WriteBehind:
+    def __init__(self, interval=WRITE_BEHIND_MS / 1000.0, max_pending=WRITE_BEHIND_MAX_PENDING):
+        self.interval = interval
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # one flush at a time keeps last-write-wins in order
+        self._values = {}    # path -> value
+        self._flushing = {}  # the batch being written: still visible to get()
+        self._thread = None
+        self._stopping = threading.Event()
+        self.counters = {"queued": 0, "merged": 0, "flushed": 0, "rejected": 0, "dropped": 0}
+        self.flushes = {"ok": 0, "failed": 0}
+        self.flush_seconds = 0.0
+
+    # ---------------- queueing ----------------
+    def set(self, path, value):
+        with self._lock:
+            self.counters["merged" if path in self._values else "queued"] += 1
+            self._values[path] = value
+            full = len(self._values) >= self.max_pending
+        if self.interval <= 0 or full:
+            self.flush()
+        else:
+            self._ensure_thread()
+
+    def get(self, path, default=None):
+        """The queued (or flushing) value of `path`, else `default`."""
+        with self._lock:
+            if path in self._values:
+                return self._values[path]
+            return self._flushing.get(path, default)
+
+    @property
+    def size(self):
+        return len(self._values)
+
+    # ---------------- flushing ----------------
+    def _ensure_thread(self):
+        if self._thread is not None or self._stopping.is_set():
+            return
+        with self._lock:
+            if self._thread is None:
+                # started on first use: after gunicorn forks, and only in workers that need it
+                self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        """Write everything queued as one multi-path update; returns the number of paths written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._values = self._values, {}
+                if not batch:
+                    return 0
+                self._flushing = batch
+
+            started = time.perf_counter()
+            written, failed = 0, {}
+            try:
+                written, failed = self._write(batch)
+            finally:
+                with self._lock:
+                    self._flushing = {}
+                    self.flush_seconds += time.perf_counter() - started
+                    self.counters["flushed"] += written
+                    self.flushes["failed" if failed else "ok"] += 1
+                    if failed:
+                        self._requeue(failed)
+            return written
+
+    def _write(self, updates):
+        """(paths written, {path: value} to retry); splits batches RTDB refuses."""
+        try:
+            datastore.reference().update(updates)
+            return len(updates), {}
+        except Exception as e:
+            if not datastore.is_rejected(e):
+                log.warning("write-behind: flush of %d paths failed (%s)", len(updates), e)
+                return 0, updates
+            if len(updates) == 1:
+                log.error("write-behind: RTDB rejected %s (%s), dropping it", next(iter(updates)), e)
+                with self._lock:
+                    self.counters["rejected"] += 1
+                return 0, {}
+        items = list(updates.items())
+        half = len(items) // 2
+        written, failed = 0, {}
+        for part in (dict(items[:half]), dict(items[half:])):
+            n, retry = self._write(part)
+            written += n
+            failed.update(retry)
+        return written, failed
+
+    def _requeue(self, failed):
+        if len(self._values) + len(failed) > self.max_pending:
+            log.error("write-behind: dropping %d paths, queue is full", len(failed))
+            self.counters["dropped"] += len(failed)
+            return
+        # writes queued since the failed flush are newer: they win
+        self._values = {**failed, **self._values}
+
+    def stop(self):
+        """Stop the flush thread and write what is still queued (later writes flush inline)."""
+        self._stopping.set()
+        self.interval = 0
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=1.0)
+        self.flush()
+
+    # ---------------- metrics ----------------
+    def prometheus_lines(self):
+        with self._lock:
+            counters, flushes = dict(self.counters), dict(self.flushes)
+            pending, seconds = len(self._values), self.flush_seconds
+        lines = ["# TYPE gojo_write_behind_writes_total counter"]
+        lines += [f'gojo_write_behind_writes_total{{outcome="{k}"}} {v}' for k, v in sorted(counters.items())]
+        lines.append("# TYPE gojo_write_behind_flushes_total counter")
+        lines += [f'gojo_write_behind_flushes_total{{outcome="{k}"}} {v}' for k, v in sorted(flushes.items())]
+        lines.append("# TYPE gojo_write_behind_pending gauge")
+        lines.append(f"gojo_write_behind_pending {pending}")
+        lines.append("# TYPE gojo_write_behind_flush_seconds_total counter")
+        lines.append(f"gojo_write_behind_flush_seconds_total {seconds:.6f}")
+        return lines